@@ -1,12 +1,134 @@
+import json
+
 from django.contrib import admin
-from .models import CustomUser, Restaurant, MenuItem, Order, OrderItem, Cart, CartItem, Transaction
-
-# Register your models here.
-admin.site.register(CustomUser)
-admin.site.register(Restaurant)
-admin.site.register(MenuItem)
-admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(Cart)
-admin.site.register(CartItem)
-admin.site.register(Transaction)
\ No newline at end of file
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .paginators import ApproximateCountPaginator
+from .models import CustomUser, Restaurant, MenuItem, Order, OrderItem, Cart, CartItem, Transaction, RequestProfile
+from .profiling import stats_text
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # Newest first by primary key, which the (filter, -id) indexes serve, and no
+    # second unfiltered count for the "N total" link. Name searches are prefix
+    # matches, backed by the case-insensitive name indexes from migration 0016.
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    ordering = ['-id']
+    list_per_page = 50
+
+    def get_search_results(self, request, queryset, search_term):
+        # Emails are stored lowercased, so exact lookups on them can use the index.
+        return super().get_search_results(request, queryset, search_term.strip().lower())
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(LargeTableAdmin):
+    list_display = ['email', 'first_name', 'last_name', 'is_customer', 'is_staff', 'date_joined']
+    search_fields = ['email__exact']
+
+
+@admin.register(Restaurant)
+class RestaurantAdmin(LargeTableAdmin):
+    list_display = ['name', 'location', 'user']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['name__istartswith', 'user__email__exact']
+
+
+@admin.register(MenuItem)
+class MenuItemAdmin(LargeTableAdmin):
+    list_display = ['name', 'restaurant', 'category', 'price', 'available', 'updated_at']
+    list_select_related = ['restaurant']
+    list_filter = ['category', 'available']
+    raw_id_fields = ['restaurant']
+    # Only the item's own name: OR-ing in the restaurant's across the join rules out the index.
+    search_fields = ['name__istartswith']
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ['id', 'user', 'status', 'payment_methods', 'total_price', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['status']
+    raw_id_fields = ['user']
+    # Kept by api/stock.py as the status changes.
+    readonly_fields = ['stock_reserved']
+    search_fields = ['user__email__exact']
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ['__str__', 'order', 'ordered_price']
+    list_select_related = ['menu_item', 'order__user']
+    raw_id_fields = ['order', 'menu_item']
+    search_fields = ['order__user__email__exact']
+
+
+@admin.register(Cart)
+class CartAdmin(LargeTableAdmin):
+    list_display = ['__str__', 'total_price', 'updated_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['user__email__exact']
+
+
+@admin.register(CartItem)
+class CartItemAdmin(LargeTableAdmin):
+    list_display = ['__str__', 'cart']
+    list_select_related = ['menu_item', 'cart__user']
+    raw_id_fields = ['cart', 'menu_item']
+    search_fields = ['cart__user__email__exact']
+
+
+@admin.register(Transaction)
+class TransactionAdmin(LargeTableAdmin):
+    list_display = ['id', 'ordered_id', 'user', 'amount_due', 'payment_method', 'status', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['status']
+    raw_id_fields = ['order', 'user']
+    search_fields = ['user__email__exact']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'sql_duration_ms', 'downloads']
+    list_filter = ['method', 'status_code']
+    search_fields = ['path']
+    fields = ['user', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'sql_duration_ms', 'created_at', 'downloads', 'top_functions']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/<str:kind>/', self.admin_site.admin_view(self.download), name='api_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if kind == 'prof':
+            # Raw pstats dump: `python -m pstats request-<id>.prof` or snakeviz.
+            response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+        elif kind == 'sql':
+            response = HttpResponse(json.dumps(profile.sql_log, indent=2), content_type='application/json')
+        else:
+            return HttpResponse(status=404)
+        extension = 'prof' if kind == 'prof' else 'sql.json'
+        response['Content-Disposition'] = f'attachment; filename="request-{profile.pk}.{extension}"'
+        return response
+
+    @admin.display(description='Downloads')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">SQL log</a>',
+            reverse('admin:api_requestprofile_download', args=[obj.pk, 'prof']),
+            reverse('admin:api_requestprofile_download', args=[obj.pk, 'sql']),
+        )
+
+    @admin.display(description='Top functions')
+    def top_functions(self, obj):
+        return format_html('<pre>{}</pre>', stats_text(obj))
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedTransaction, Cart, CartItem, Order, OrderItem, Transaction,
+)
+from .summaries import suspend_summary_updates
+
+
+ARCHIVABLE_STATUSES = ("delivered", "cancelled")
+
+ORDER_FIELDS = ["id", "user_id", "status", "total_price", "payment_methods", "created_at", "updated_at"]
+ORDER_ITEM_FIELDS = ["id", "order_id", "menu_item_id", "quantity", "ordered_price"]
+TRANSACTION_FIELDS = [
+    "id", "order_id", "ordered_id", "amount_due", "payment_method", "status", "user_id", "created_at", "updated_at",
+]
+
+
+def archive_orders(older_than, batch_size=500):
+    """
+    Move finished orders last touched before `older_than` ago, with their items
+    and transactions, into the archive tables. Each batch is copied and deleted
+    in its own transaction so the live tables are never locked for long.
+    Returns the number of orders archived.
+    """
+    cutoff = timezone.now() - older_than
+    candidates = Order.objects.filter(status__in=ARCHIVABLE_STATUSES, updated_at__lt=cutoff).order_by("id")
+    archived = 0
+    while True:
+        with transaction.atomic():
+            ids = list(candidates.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            ArchivedOrder.objects.bulk_create(
+                ArchivedOrder(**row) for row in Order.objects.filter(id__in=ids).values(*ORDER_FIELDS)
+            )
+            ArchivedOrderItem.objects.bulk_create(
+                ArchivedOrderItem(**row) for row in OrderItem.objects.filter(order_id__in=ids).values(*ORDER_ITEM_FIELDS)
+            )
+            ArchivedTransaction.objects.bulk_create(
+                ArchivedTransaction(**row)
+                for row in Transaction.objects.filter(order_id__in=ids).values(*TRANSACTION_FIELDS)
+            )
+            # Archiving is not undoing: the users' order summaries keep these orders.
+            with suspend_summary_updates():
+                Transaction.objects.filter(order_id__in=ids).delete()
+                Order.objects.filter(id__in=ids).delete()
+        archived += len(ids)
+    return archived
+
+
+def purge_abandoned_carts(older_than, batch_size=500):
+    """
+    Delete carts (and their items) nobody touched for `older_than`. Carts are
+    recreated empty on the user's next visit. Returns the number of carts purged.
+    """
+    cutoff = timezone.now() - older_than
+    candidates = Cart.objects.filter(updated_at__lt=cutoff).order_by("id")
+    purged = 0
+    while True:
+        with transaction.atomic():
+            ids = list(candidates.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            # Queryset deletes skip CartItem.delete(), which would re-save the cart.
+            CartItem.objects.filter(cart_id__in=ids).delete()
+            Cart.objects.filter(id__in=ids).delete()
+        purged += len(ids)
+    return purged
@@ -0,0 +1,246 @@
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.fields import DateTimeField
+
+from .models import Cart, CartItem, MenuItem
+
+
+CART_KEY = 'cart-state:{}'
+DIRTY_KEY = 'cart-state:dirty'
+LOCK_KEY = 'cart-state:lock:{}'
+LOCK_TIMEOUT = 5
+# Long enough for a lock left by a dead worker to expire.
+LOCK_WAIT = LOCK_TIMEOUT + 1
+
+_datetime = DateTimeField()
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The cart is being updated, try again.'
+    default_code = 'cart_busy'
+
+
+def cart_cache_enabled():
+    return getattr(settings, 'CART_CACHE_ENABLED', False)
+
+
+def _cache():
+    return caches[settings.CART_CACHE_ALIAS]
+
+
+def get_user_cart(user):
+    # Carts are created lazily and may have been purged as abandoned.
+    return Cart.objects.get_or_create(user=user, defaults={'total_price': 0})[0]
+
+
+def load_cart_state(user):
+    """
+    The cached cart for `user`: quantities, prices and names keyed by menu item
+    id, plus the row ids they were last flushed to. Built from the database in
+    two queries on a miss.
+    """
+    state = _cache().get(CART_KEY.format(user.pk))
+    if state is None:
+        cart = get_user_cart(user)
+        state = {
+            'id': cart.pk,
+            'user': str(user),
+            'items': {},
+            'prices': {},
+            'names': {},
+            'row_ids': {},
+            # Bumped by every change, so a flush can tell whether it wrote the latest state.
+            'version': 0,
+            'created_at': _datetime.to_representation(cart.created_at),
+            'updated_at': _datetime.to_representation(cart.updated_at),
+        }
+        for item in cart.cartitems.select_related('menu_item'):
+            menu_item_id = item.menu_item_id
+            state['items'][menu_item_id] = state['items'].get(menu_item_id, 0) + item.quantity
+            state['prices'][menu_item_id] = str(item.menu_item.price)
+            state['names'][menu_item_id] = item.menu_item.name
+            state['row_ids'].setdefault(menu_item_id, item.pk)
+        # add() rather than set(): a change made while this was loading wins.
+        if not _cache().add(CART_KEY.format(user.pk), state, timeout=settings.CART_CACHE_TIMEOUT):
+            return load_cart_state(user)
+    return state
+
+
+def _save_state(user_id, state):
+    _cache().set(CART_KEY.format(user_id), state, timeout=settings.CART_CACHE_TIMEOUT)
+
+
+@contextmanager
+def _cart_lock(user_id):
+    # Serializes read-modify-write of one cached cart across workers; cache.add
+    # is atomic, and a lock left by a dead worker expires after LOCK_TIMEOUT.
+    # Raises CartBusy if the lock cannot be had within LOCK_WAIT seconds.
+    cache = _cache()
+    key = LOCK_KEY.format(user_id)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, token, timeout=LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise CartBusy()
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        # Only our own lock: if ours expired, another worker may hold the key now.
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def invalidate_cart_state(user):
+    _cache().delete(CART_KEY.format(user.pk))
+
+
+def item_representation(state, menu_item_id):
+    quantity = state['items'][menu_item_id]
+    return {
+        'id': state['row_ids'].get(menu_item_id),
+        'cart': state['id'],
+        'menu_item': menu_item_id,
+        'menu_item_name': state['names'][menu_item_id],
+        'quantity': quantity,
+        'subtotal': str(Decimal(state['prices'][menu_item_id]) * quantity),
+    }
+
+
+def cart_representation(state):
+    # Same shape as CartSerializer.
+    items = [item_representation(state, menu_item_id) for menu_item_id in state['items']]
+    total = sum((Decimal(item['subtotal']) for item in items), Decimal('0.00'))
+    return {
+        'id': state['id'],
+        'user': state['user'],
+        'total_price': str(total),
+        'cartitems': items,
+        'created_at': state['created_at'],
+        'updated_at': state['updated_at'],
+    }
+
+
+def add_item(user, menu_item, quantity):
+    """Add `quantity` of `menu_item` to the cached cart and queue it for flushing."""
+    load_cart_state(user)  # Any database load happens before taking the lock.
+    with _cart_lock(user.pk):
+        state = load_cart_state(user)
+        state['items'][menu_item.pk] = state['items'].get(menu_item.pk, 0) + quantity
+        state['prices'][menu_item.pk] = str(menu_item.price)
+        state['names'][menu_item.pk] = menu_item.name
+        state['updated_at'] = _datetime.to_representation(timezone.now())
+        state['version'] = state.get('version', 0) + 1
+        _save_state(user.pk, state)
+    _mark_dirty(user.pk)
+    return state
+
+
+def _mark_dirty(user_id):
+    # Read-modify-write on a shared cache can drop a concurrent entry; such a cart
+    # still reaches the database on its owner's next change or at checkout.
+    # Dirty carts are written by `manage.py flush_carts`, not on the request path.
+    cache = _cache()
+    dirty = cache.get(DIRTY_KEY, set())
+    dirty.add(user_id)
+    cache.set(DIRTY_KEY, dirty, timeout=None)
+
+
+def flush_cart(user):
+    """Write the cached cart for `user` to the Cart/CartItem tables, if it has one."""
+    state = _cache().get(CART_KEY.format(user.pk))
+    if state is None:
+        return
+    if _flush_state(user.pk, state):
+        cache = _cache()
+        dirty = cache.get(DIRTY_KEY, set())
+        if user.pk in dirty:
+            dirty.discard(user.pk)
+            cache.set(DIRTY_KEY, dirty, timeout=None)
+
+
+def flush_dirty_carts():
+    """Flush every cart changed since the last flush. Returns how many were written."""
+    cache = _cache()
+    dirty = cache.get(DIRTY_KEY, set())
+    cache.set(DIRTY_KEY, set(), timeout=None)
+    flushed = 0
+    for user_id in dirty:
+        state = cache.get(CART_KEY.format(user_id))
+        if state is None:
+            continue
+        try:
+            written = _flush_state(user_id, state)
+        except CartBusy:
+            written = False
+        if not written:
+            _mark_dirty(user_id)
+        flushed += 1
+    return flushed
+
+
+def _flush_state(user_id, state):
+    """
+    Write `state` to the tables, then apply what the write learned (row ids,
+    current prices, items whose menu item is gone) to the newest cached state
+    rather than overwriting it, so changes made during the flush are kept.
+    Returns False when such changes still need flushing.
+    """
+    written = _write_state(user_id, state)
+    with _cart_lock(user_id):
+        current = _cache().get(CART_KEY.format(user_id))
+        if current is None:
+            return True
+        for menu_item_id in written['removed']:
+            for field in ('items', 'prices', 'names', 'row_ids'):
+                current[field].pop(menu_item_id, None)
+        current['id'] = written['id']
+        current['prices'].update({i: p for i, p in written['prices'].items() if i in current['items']})
+        current['row_ids'] = {i: pk for i, pk in written['row_ids'].items() if i in current['items']}
+        _save_state(user_id, current)
+        return current.get('version', 0) == state.get('version', 0)
+
+
+@transaction.atomic
+def _write_state(user_id, state):
+    cart, _ = Cart.objects.get_or_create(user_id=user_id, defaults={'total_price': 0})
+    # Prices may have changed since items were added; the flush picks up current ones.
+    prices = {i: str(p) for i, p in MenuItem.objects.filter(pk__in=state['items']).values_list('pk', 'price')}
+    items = {i: q for i, q in state['items'].items() if i in prices}
+
+    rows = {}
+    stale = []
+    for row in CartItem.objects.filter(cart=cart):
+        if row.menu_item_id in items and row.menu_item_id not in rows:
+            rows[row.menu_item_id] = row
+        else:
+            stale.append(row.pk)
+    # Queryset operations skip CartItem.save()/delete(), which re-save the cart per row.
+    CartItem.objects.filter(pk__in=stale).delete()
+    changed = []
+    for menu_item_id, row in rows.items():
+        if row.quantity != items[menu_item_id]:
+            row.quantity = items[menu_item_id]
+            changed.append(row)
+    CartItem.objects.bulk_update(changed, ['quantity'])
+    created = CartItem.objects.bulk_create(
+        CartItem(cart=cart, menu_item_id=menu_item_id, quantity=quantity)
+        for menu_item_id, quantity in items.items()
+        if menu_item_id not in rows
+    )
+    row_ids = {menu_item_id: row.pk for menu_item_id, row in rows.items()}
+    row_ids.update({row.menu_item_id: row.pk for row in created})
+
+    total = sum((Decimal(prices[i]) * q for i, q in items.items()), Decimal('0.00'))
+    Cart.objects.filter(pk=cart.pk).update(total_price=total, updated_at=timezone.now())
+    return {'id': cart.pk, 'prices': prices, 'row_ids': row_ids, 'removed': set(state['items']) - set(items)}
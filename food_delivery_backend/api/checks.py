@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Cache backends that are private to each process.
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_cart_cache(app_configs, **kwargs):
+    # Write-behind carts are flushed by a separate `flush_carts` process, which
+    # only sees them through a cache every worker shares.
+    if not getattr(settings, 'CART_CACHE_ENABLED', False):
+        return []
+    backend = settings.CACHES.get(settings.CART_CACHE_ALIAS, {}).get('BACKEND')
+    if backend in PER_PROCESS_BACKENDS:
+        return [Error(
+            f"CART_CACHE_ALIAS '{settings.CART_CACHE_ALIAS}' uses {backend}, which is not shared between processes.",
+            hint="Point CART_CACHE_ALIAS at a shared cache such as Redis or Memcached, or set CART_CACHE_ENABLED = False.",
+            id='api.E001',
+        )]
+    return []
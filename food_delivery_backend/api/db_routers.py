@@ -0,0 +1,45 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Reads go to the primary unless something (normally ReplicaRoutingMiddleware
+# for a safe request) has explicitly allowed replicas for the current context.
+_replica_reads_allowed = ContextVar('replica_reads_allowed', default=False)
+
+
+@contextmanager
+def allow_replica_reads(allowed=True):
+    token = _replica_reads_allowed.set(allowed)
+    try:
+        yield
+    finally:
+        _replica_reads_allowed.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send writes to 'default' and, when allowed, reads to a random alias from
+    DATABASE_REPLICAS. Reads inside an open transaction on the primary stay
+    there so they see its uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or not _replica_reads_allowed.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', [])}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
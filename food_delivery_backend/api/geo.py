@@ -0,0 +1,110 @@
+import math
+
+from django.db.models import Q
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+STORED_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+# Widens the search box so floating-point rounding cannot leave a point on its edge outside.
+BOX_MARGIN = 1 + 1e-6
+MAX_CELLS = 16
+
+
+def encode_geohash(lat, lng, precision=STORED_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    # Longitude takes the first of every pair of bits, so it gets the odd one.
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def covering_cells(lat, lng, radius_km, max_cells=MAX_CELLS):
+    """
+    Geohash prefixes whose cells together contain every point within
+    `radius_km` of (lat, lng). The circle's bounding box is tiled at the finest
+    precision that needs no more than `max_cells` cells. Returns None when even
+    single-character cells would not narrow the search.
+    """
+    # Exact bounding box of a circle on the same sphere haversine_km measures on.
+    angle = radius_km * BOX_MARGIN / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    ratio = math.sin(angle) / max(math.cos(math.radians(lat)), 1e-12)
+    # The circle reaches a pole, or wraps all the way round in longitude.
+    if north >= 90.0 or south <= -90.0 or ratio >= 1:
+        dlng = 180.0
+    else:
+        dlng = math.degrees(math.asin(ratio))
+
+    for precision in range(STORED_PRECISION, 0, -1):
+        height, width = cell_size_degrees(precision)
+        rows = math.floor(north / height) - math.floor(south / height) + 1
+        cols = math.floor((lng + dlng) / width) - math.floor((lng - dlng) / width) + 1
+        if rows * cols <= max_cells:
+            break
+    else:
+        return None
+    if rows * cols * height * width >= 180.0 * 360.0:
+        return None
+
+    cells = set()
+    for row in range(rows):
+        cell_lat = min(south + row * height, north)
+        for col in range(cols):
+            cell_lng = (lng - dlng + col * width + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_lat, cell_lng, precision))
+    return sorted(cells)
+
+
+def geohash_prefix_filter(cells, field='geohash'):
+    # Prefix match as a range so the index is used on both SQLite and Postgres.
+    query = Q()
+    for cell in cells:
+        query |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '~'})
+    return query
+
+
+def nearby(queryset, lat, lng, radius_km, use_index=True):
+    """
+    Objects from `queryset` (with latitude, longitude and geohash) within
+    `radius_km`, closest first, each annotated with `distance_km`. Geohash
+    cells prune the candidates; exact distance ranks what is left.
+    """
+    candidates = queryset.exclude(geohash='').order_by()
+    cells = covering_cells(lat, lng, radius_km) if use_index else None
+    if cells is not None:
+        candidates = candidates.filter(geohash_prefix_filter(cells))
+    found = []
+    for obj in candidates:
+        obj.distance_km = haversine_km(lat, lng, obj.latitude, obj.longitude)
+        if obj.distance_km <= radius_km:
+            found.append(obj)
+    found.sort(key=lambda obj: obj.distance_km)
+    return found
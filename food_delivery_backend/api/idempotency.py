@@ -0,0 +1,105 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim_key(user, scope, key, request_hash):
+    """
+    Insert the key row, relying on the unique constraint to decide which of
+    several concurrent requests runs the view. Returns (record, claimed).
+    A claim only lives for IDEMPOTENCY_PENDING_TIMEOUT until its response is
+    stored, so a key left behind by a crashed worker can be claimed again.
+    """
+    now = timezone.now()
+    fields = {
+        'user': user,
+        'scope': scope,
+        'key': key,
+        'request_hash': request_hash,
+        'expires_at': now + settings.IDEMPOTENCY_PENDING_TIMEOUT,
+    }
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(**fields), True
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+        if record is None:
+            continue
+        if record.expires_at > now:
+            return record, False
+        # An expired key is free to be reused; whoever deletes it gets to retry.
+        IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+    return record, False
+
+
+def replay(record, request_hash):
+    if record is not None and record.request_hash != request_hash:
+        return Response(
+            {'detail': f'{HEADER} was already used with a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record is None or record.status_code is None:
+        return Response(
+            {'detail': f'A request with this {HEADER} is still being processed.'},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+class IdempotentCreateMixin:
+    """
+    Makes `create` safe to retry: when the client sends an Idempotency-Key header,
+    the first successful response is stored and returned for every repeat of the
+    same request without running `perform_create` again.
+    """
+
+    idempotency_scope = None
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        request_hash = request_fingerprint(request.data)
+        record, claimed = claim_key(request.user, self.idempotency_scope, key, request_hash)
+        if not claimed:
+            return replay(record, request_hash)
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            # Failed requests (validation errors included) release the key so the
+            # client can fix the payload and retry with it.
+            record.delete()
+            raise
+        # An update rather than save(): if this request outlived its claim, the
+        # row may have been taken over, and that request's result wins.
+        IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).update(
+            status_code=response.status_code,
+            response_body=response.data,
+            expires_at=timezone.now() + settings.IDEMPOTENCY_KEY_TTL,
+        )
+        return response
@@ -0,0 +1,165 @@
+import logging
+import multiprocessing
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .stock import OutOfStock, reserve_stock
+from .models import MenuItem, Order, OrderIntake, OrderItem, Transaction
+from .summaries import record_items, record_orders
+
+
+logger = logging.getLogger(__name__)
+
+
+def queued_intakes(worker=0, workers=1):
+    # Workers of one pool split the queue by id, so they rarely contend for the same rows.
+    queued = OrderIntake.objects.filter(status='queued')
+    if workers > 1:
+        queued = queued.alias(slot=Mod('id', workers)).filter(slot=worker)
+    return queued.order_by('id')
+
+
+def claim_intakes(batch_size, worker=0, workers=1):
+    """
+    Claim up to `batch_size` queued intakes for the current transaction. The
+    conditional UPDATE only takes rows still queued, so separate invocations
+    (other hosts, other pools) never process the same intake; the claim commits
+    or rolls back with the batch, so a crashed worker leaves nothing stuck.
+    """
+    candidates = queued_intakes(worker, workers)
+    if connection.features.has_select_for_update_skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    ids = list(candidates.values_list('id', flat=True)[:batch_size])
+    OrderIntake.objects.filter(pk__in=ids, status='queued').update(status='processing')
+    return list(OrderIntake.objects.filter(pk__in=ids, status='processing').order_by('id'))
+
+
+@transaction.atomic
+def process_intake_batch(batch_size=200, worker=0, workers=1):
+    """
+    Turn up to `batch_size` queued intakes into orders, order items and pending
+    transactions with one bulk insert per table. Intakes naming unknown,
+    unavailable or sold-out menu items are rejected. Returns the number of
+    intakes handled.
+    """
+    intakes = claim_intakes(batch_size, worker, workers)
+    if not intakes:
+        return 0
+    menu_item_ids = {line['menu_item'] for intake in intakes for line in intake.payload['items']}
+    prices = dict(MenuItem.objects.filter(pk__in=menu_item_ids, available=True).values_list('pk', 'price'))
+
+    now = timezone.now()
+    accepted = []
+    for intake in intakes:
+        missing = [line['menu_item'] for line in intake.payload['items'] if line['menu_item'] not in prices]
+        if missing:
+            intake.status, intake.error, intake.processed_at = 'rejected', f"Unavailable menu items: {missing}"[:255], now
+            continue
+        quantities = Counter()
+        for line in intake.payload['items']:
+            quantities[line['menu_item']] += line['quantity']
+        try:
+            reserve_stock(quantities)
+        except OutOfStock as exc:
+            intake.status, intake.error, intake.processed_at = 'rejected', f"Out of stock: {exc.menu_item_ids}"[:255], now
+            continue
+        total = sum((prices[line['menu_item']] * line['quantity'] for line in intake.payload['items']), Decimal('0.00'))
+        intake.order = Order(
+            user_id=intake.user_id, payment_methods=intake.payload['payment_methods'], total_price=total,
+            stock_reserved=True,
+        )
+        accepted.append(intake)
+
+    # Built directly, bypassing the per-row save() overrides: prices and totals are computed above.
+    orders = Order.objects.bulk_create([intake.order for intake in accepted])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=intake.order, menu_item_id=line['menu_item'], quantity=line['quantity'], ordered_price=prices[line['menu_item']])
+        for intake in accepted
+        for line in intake.payload['items']
+    ])
+    Transaction.objects.bulk_create([
+        Transaction(
+            order=order,
+            ordered_id=order.pk,
+            amount_due=order.total_price,
+            payment_method=order.payment_methods,
+            user_id=order.user_id,
+        )
+        for order in orders
+    ])
+    for intake in accepted:
+        intake.status, intake.processed_at = 'processed', now
+    OrderIntake.objects.bulk_update(intakes, ['status', 'error', 'order', 'processed_at'])
+
+    # Bulk inserts send no signals, so order summaries are updated here.
+    record_orders(orders)
+    deltas = defaultdict(Counter)
+    for intake in accepted:
+        for line in intake.payload['items']:
+            deltas[intake.user_id][line['menu_item']] += line['quantity']
+    record_items(deltas)
+    return len(intakes)
+
+
+def _is_lock_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def run_intake_worker(worker=0, workers=1, batch_size=None, poll_interval=None, once=False):
+    """
+    Process this worker's share of the queue until it is empty (`once`) or
+    forever, polling every `poll_interval` seconds when idle. Returns the number
+    of intakes handled.
+    """
+    batch_size = batch_size or settings.INTAKE_BATCH_SIZE
+    poll_interval = settings.INTAKE_POLL_INTERVAL if poll_interval is None else poll_interval
+    handled = 0
+    lock_failures = 0
+    while True:
+        try:
+            count = process_intake_batch(batch_size, worker, workers)
+        except OperationalError as exc:
+            # SQLite allows one writer at a time; back off and retry when another
+            # worker holds the lock. Anything else is a real failure.
+            if not _is_lock_error(exc) or lock_failures >= settings.INTAKE_LOCK_RETRIES:
+                raise
+            lock_failures += 1
+            logger.warning("Intake worker %d found the database locked (%d/%d), retrying",
+                           worker, lock_failures, settings.INTAKE_LOCK_RETRIES)
+            time.sleep(poll_interval / 10)
+            continue
+        lock_failures = 0
+        handled += count
+        if count == 0:
+            if once:
+                return handled
+            time.sleep(poll_interval)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def process_order_intake(workers=None, batch_size=None, poll_interval=None, once=False):
+    """
+    Run `workers` processes, each owning the intakes whose id modulo `workers`
+    equals its number. Processes are forked, so connections are closed first
+    and every worker opens its own. Returns the number of intakes handled.
+    """
+    workers = workers or settings.INTAKE_WORKERS
+    if workers == 1:
+        return run_intake_worker(0, 1, batch_size, poll_interval, once)
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(workers, initializer=_init_worker) as pool:
+        counts = pool.starmap(
+            run_intake_worker, [(worker, workers, batch_size, poll_interval, once) for worker in range(workers)]
+        )
+    return sum(counts)
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.archival import archive_orders, purge_abandoned_carts
+
+
+class Command(BaseCommand):
+    help = "Move old delivered/cancelled orders to the archive tables and purge abandoned carts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order-age-days", type=int, help="Defaults to ARCHIVE_ORDERS_AFTER.")
+        parser.add_argument("--cart-age-days", type=int, help="Defaults to ARCHIVE_CARTS_AFTER.")
+        parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        order_age = settings.ARCHIVE_ORDERS_AFTER
+        if options["order_age_days"] is not None:
+            order_age = timedelta(days=options["order_age_days"])
+        cart_age = settings.ARCHIVE_CARTS_AFTER
+        if options["cart_age_days"] is not None:
+            cart_age = timedelta(days=options["cart_age_days"])
+
+        orders = archive_orders(order_age, batch_size=options["batch_size"])
+        carts = purge_abandoned_carts(cart_age, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {orders} orders, purged {carts} abandoned carts"))
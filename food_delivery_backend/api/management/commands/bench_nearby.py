@@ -0,0 +1,63 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.geo import nearby
+from api.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark nearby-restaurant search with geohash pruning against a full scan. "
+        "Synthetic restaurants are inserted in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=100)
+        parser.add_argument("--radius", type=float, default=5.0, help="Search radius in km.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        # Spread around Kampala, roughly 330km x 330km.
+        center_lat, center_lng, spread = 0.3476, 32.5825, 1.5
+
+        def point():
+            return center_lat + rng.uniform(-spread, spread), center_lng + rng.uniform(-spread, spread)
+
+        with transaction.atomic():
+            owner = get_user_model().objects.create(email=f"bench-{uuid.uuid4().hex}@example.invalid")
+            restaurants = []
+            for n in range(options["count"]):
+                lat, lng = point()
+                restaurant = Restaurant(user=owner, name=f"Bench {owner.pk}-{n}", location="", latitude=lat, longitude=lng)
+                restaurant.update_geohash()
+                restaurants.append(restaurant)
+            started = time.perf_counter()
+            Restaurant.objects.bulk_create(restaurants, batch_size=2000)
+            self.stdout.write(f"Inserted {options['count']} restaurants in {time.perf_counter() - started:.1f}s")
+
+            queries = [point() for _ in range(options["queries"])]
+            results = {}
+            for label, use_index in (("geohash", True), ("full scan", False)):
+                timings, found = [], 0
+                for lat, lng in queries:
+                    started = time.perf_counter()
+                    found += len(nearby(Restaurant.objects.all(), lat, lng, options["radius"], use_index=use_index))
+                    timings.append((time.perf_counter() - started) * 1000)
+                results[label] = found
+                timings.sort()
+                self.stdout.write(
+                    f"{label:>10}: median {statistics.median(timings):8.2f}ms  "
+                    f"p95 {timings[int(len(timings) * 0.95) - 1]:8.2f}ms  "
+                    f"avg hits {found / len(queries):.1f}"
+                )
+            if results["geohash"] != results["full scan"]:
+                self.stderr.write("Geohash search returned different results from the full scan")
+            transaction.set_rollback(True)
@@ -0,0 +1,80 @@
+import random
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.intake import process_order_intake
+from api.models import MenuItem, Order, OrderIntake, OrderItem, Restaurant, Transaction
+from api.summaries import suspend_summary_updates
+from api.views import OrderIntakeCreateView
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark order placement one order per transaction against the intake queue "
+        "drained by process_order_intake. Worker processes need committed rows, so the "
+        "synthetic users and orders are written to the configured database and deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        tag = uuid.uuid4().hex
+        User = get_user_model()
+        users = [User.objects.create(email=f"bench-{tag}-{n}@example.invalid") for n in range(options["users"])]
+        try:
+            restaurant = Restaurant.objects.create(user=users[0], name=f"Bench {tag}", location="")
+            menu_items = MenuItem.objects.bulk_create(
+                MenuItem(restaurant=restaurant, name=f"Item {n}", category="main_course", price=rng.randint(5, 50) * 1000)
+                for n in range(20)
+            )
+            orders = [
+                (
+                    rng.choice(users),
+                    [(rng.choice(menu_items), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))],
+                )
+                for _ in range(options["orders"])
+            ]
+
+            started = time.perf_counter()
+            for user, lines in orders:
+                with transaction.atomic():
+                    order = Order.objects.create(user=user, payment_methods="cash")
+                    for menu_item, quantity in lines:
+                        OrderItem.objects.create(order=order, menu_item=menu_item, quantity=quantity)
+                    order.save()
+                    Transaction.objects.create(order=order)
+            self.report("per-order writes", len(orders), time.perf_counter() - started)
+
+            factory = APIRequestFactory()
+            view = OrderIntakeCreateView.as_view()
+            started = time.perf_counter()
+            for user, lines in orders:
+                body = {"payment_methods": "cash", "items": [{"menu_item": m.pk, "quantity": q} for m, q in lines]}
+                request = factory.post("/orders/intake/", body, format="json")
+                force_authenticate(request, user=user)
+                view(request)
+            self.report("intake acknowledged", len(orders), time.perf_counter() - started)
+
+            started = time.perf_counter()
+            handled = process_order_intake(workers=options["workers"], batch_size=options["batch_size"], once=True)
+            self.report(f"intake drained ({options['workers']} workers)", handled, time.perf_counter() - started)
+            rejected = OrderIntake.objects.filter(user__in=users).exclude(status="processed").count()
+            if rejected:
+                self.stdout.write(self.style.WARNING(f"{rejected} intakes were not processed"))
+        finally:
+            with suspend_summary_updates():
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f"{label:>30}: {count} orders in {elapsed:6.2f}s  {count / elapsed:8.1f} orders/s")
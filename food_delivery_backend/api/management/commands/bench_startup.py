@@ -0,0 +1,75 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs in a fresh interpreter: boot the WSGI app, serve one request, report,
+# then time a run of warm requests.
+CHILD = r"""
+import io, json, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+booted = time.perf_counter()
+
+def environ():
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+        'SERVER_NAME': '127.0.0.1', 'SERVER_PORT': '8000', 'HTTP_HOST': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+
+statuses = []
+b''.join(application(environ(), lambda status, headers, exc_info=None: statuses.append(status)))
+served = time.perf_counter()
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+warm = int(sys.argv[2])
+for _ in range(warm):
+    b''.join(application(environ(), lambda status, headers, exc_info=None: None))
+print(json.dumps({
+    'boot_ms': (booted - started) * 1000,
+    'first_request_ms': (served - started) * 1000,
+    'warm_request_us': (time.perf_counter() - served) / max(warm, 1) * 1e6,
+    'max_rss_mb': max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    'modules': len(sys.modules),
+    'status': statuses[0],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Compare worker cold-start time and memory of the full and the API-only (SNACKNOW_API_ONLY=1) runtime."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=11)
+        parser.add_argument("--warm-requests", type=int, default=1000)
+        parser.add_argument("--path", default="/snacknow/api/v01/menu-items/categories/")
+
+    def run_child(self, api_only, path, warm_requests):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "food_delivery_backend.settings"))
+        env["SNACKNOW_API_ONLY"] = "1" if api_only else "0"
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD, path, str(warm_requests)], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        # Profiles alternate run by run so drift on the machine hits both alike.
+        samples = {False: [], True: []}
+        for _ in range(options["runs"]):
+            for api_only in samples:
+                samples[api_only].append(self.run_child(api_only, options["path"], options["warm_requests"]))
+        for label, api_only in (("full", False), ("api-only", True)):
+            runs = samples[api_only]
+            self.stdout.write(
+                f"{label:>9}: boot {statistics.median(s['boot_ms'] for s in runs):7.1f}ms  "
+                f"first request {statistics.median(s['first_request_ms'] for s in runs):7.1f}ms  "
+                f"warm request {statistics.median(s['warm_request_us'] for s in runs):6.0f}us  "
+                f"max RSS {statistics.median(s['max_rss_mb'] for s in runs):6.1f}MB  "
+                f"modules {runs[0]['modules']}  status {runs[0]['status']}"
+            )
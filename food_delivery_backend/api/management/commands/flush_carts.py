@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.cart_cache import flush_dirty_carts
+
+
+class Command(BaseCommand):
+    help = "Write carts changed in the cart cache to the Cart/CartItem tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep flushing every CART_CACHE_FLUSH_INTERVAL seconds."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = flush_dirty_carts()
+            self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts"))
+            if not options["loop"]:
+                return
+            time.sleep(settings.CART_CACHE_FLUSH_INTERVAL)
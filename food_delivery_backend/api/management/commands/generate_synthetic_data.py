@@ -0,0 +1,77 @@
+import argparse
+import os
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from api.stock import invalidate_unavailable_ids
+from api.summaries import rebuild_order_summaries
+from api.synthetic import database_size, generate_dataset, make_plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic synthetic dataset of users, restaurants, menu items, "
+        "carts, orders and transactions. Rows are added after the existing ones; the same seed and "
+        "sizes produce the same data whatever the worker count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--restaurants", type=int, default=200)
+        parser.add_argument("--items-per-restaurant", type=int, default=25)
+        parser.add_argument("--carts", type=int, default=2_000, help="Capped at --users; one cart per user.")
+        parser.add_argument("--orders", type=int, default=50_000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=5_000)
+        parser.add_argument(
+            "--insert-in-workers", action=argparse.BooleanOptionalAction,
+            help="Let workers insert their own chunks. Defaults to on, except on SQLite which has a single writer.",
+        )
+        parser.add_argument("--password", default="snacknow", help="Password of every generated user.")
+        parser.add_argument("--skip-summaries", action="store_true", help="Do not rebuild order summaries afterwards.")
+
+    def handle(self, *args, **options):
+        for option in ("users", "restaurants", "items_per_restaurant", "workers", "chunk_size"):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be at least 1")
+        for option in ("carts", "orders"):
+            if options[option] < 0:
+                raise CommandError(f"--{option} cannot be negative")
+        started = time.perf_counter()
+        size_before = database_size()
+        # Hashing is deliberately slow; every user shares this one hash.
+        plan = make_plan(
+            seed=options["seed"],
+            users=options["users"],
+            restaurants=options["restaurants"],
+            items_per_restaurant=options["items_per_restaurant"],
+            carts=options["carts"],
+            orders=options["orders"],
+            password=make_password(options["password"]),
+            chunk_size=options["chunk_size"],
+        )
+
+        def progress(stage):
+            self.stdout.write(f"{stage} done ({time.perf_counter() - started:.1f}s)")
+
+        counts = generate_dataset(
+            plan, workers=options["workers"], insert_in_workers=options["insert_in_workers"], progress=progress
+        )
+        generated = time.perf_counter()
+        if not options["skip_summaries"]:
+            rebuild_order_summaries()
+        # Bulk inserts send no signals.
+        invalidate_unavailable_ids()
+
+        for table, count in counts.items():
+            self.stdout.write(f"{table:>13}: {count}")
+        size_after = database_size()
+        if size_after is not None:
+            self.stdout.write(f"Database size: {size_before / 2 ** 20:.1f}MB -> {size_after / 2 ** 20:.1f}MB")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {sum(counts.values())} rows in {generated - started:.1f}s "
+            f"({time.perf_counter() - started:.1f}s with summaries) using {options['workers']} workers"
+        ))
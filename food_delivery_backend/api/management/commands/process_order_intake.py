@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.intake import process_order_intake
+
+
+class Command(BaseCommand):
+    help = "Turn queued order intakes into orders, order items and pending transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Defaults to INTAKE_WORKERS.")
+        parser.add_argument("--batch-size", type=int, help="Defaults to INTAKE_BATCH_SIZE.")
+        parser.add_argument("--poll-interval", type=float, help="Defaults to INTAKE_POLL_INTERVAL.")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty instead of polling.")
+
+    def handle(self, *args, **options):
+        handled = process_order_intake(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+            once=options["once"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {handled} order intakes"))
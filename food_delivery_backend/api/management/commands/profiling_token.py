@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import HEADER, make_profiling_token
+
+
+class Command(BaseCommand):
+    help = "Issue a request-profiling token for a staff user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("email")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options["email"].lower(), is_staff=True).first()
+        if user is None:
+            raise CommandError("No staff user with that email")
+        token = make_profiling_token(user)
+        self.stdout.write(token)
+        self.stderr.write(f"Send it as the {HEADER} header or the _profile query parameter.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.summaries import rebuild_order_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's order summary from the live and archived order tables."
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_order_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} order summaries"))
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.settlement import settle_pending_transactions
+
+
+class Command(BaseCommand):
+    help = "Reconcile pending transactions with the payment provider (settings.PAYMENT_PROVIDER)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Defaults to SETTLEMENT_BATCH_SIZE.")
+        parser.add_argument("--workers", type=int, help="Defaults to SETTLEMENT_MAX_WORKERS.")
+
+    def handle(self, *args, **options):
+        if not settings.PAYMENT_PROVIDER:
+            raise CommandError("Set PAYMENT_PROVIDER to the payment provider class before settling transactions.")
+        totals = settle_pending_transactions(batch_size=options["batch_size"], max_workers=options["workers"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Settled {totals['success']} successful and {totals['failed']} failed transactions; "
+            f"{totals['pending']} still pending, {totals['errors']} not reached"
+        ))
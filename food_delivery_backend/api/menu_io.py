@@ -0,0 +1,120 @@
+import codecs
+import csv
+import json
+
+from django.db import transaction
+
+from .menus import invalidate_restaurant_menu
+from .models import MenuItem
+from .serializers import MenuItemImportSerializer
+from .stock import invalidate_unavailable_ids
+
+
+MENU_FIELDS = ['name', 'category', 'price', 'description', 'available']
+UPSERT_FIELDS = ['category', 'price', 'description', 'available', 'updated_at']
+READ_CHUNK = 64 * 1024
+PARSE_ERRORS = (ValueError, UnicodeDecodeError, csv.Error)
+
+
+def iter_csv_rows(stream):
+    # `stream` only needs read(); rows are decoded as they arrive. Empty cells
+    # are dropped so the model defaults apply to them.
+    for row in csv.DictReader(codecs.getreader('utf-8-sig')(stream)):
+        yield {key: value for key, value in row.items() if value not in ('', None)}
+
+
+def iter_json_rows(stream):
+    """
+    Yield objects from a JSON array or from JSON Lines without loading the
+    whole body: objects are decoded from a rolling buffer and anything between
+    them (brackets, commas, whitespace) is skipped.
+    """
+    reader = codecs.getreader('utf-8-sig')(stream)
+    decoder = json.JSONDecoder()
+    buffer, pos = '', 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n[],':
+            pos += 1
+        if pos >= len(buffer):
+            buffer, pos = reader.read(READ_CHUNK), 0
+            if not buffer:
+                return
+            continue
+        try:
+            row, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = reader.read(READ_CHUNK)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield row
+
+
+@transaction.atomic
+def import_menu_items(restaurant, rows, batch_size=500):
+    """
+    Upsert menu items for `restaurant` from an iterable of dicts. Existing names
+    are read once up front, rows are validated one by one and written with
+    bulk_create(update_conflicts=True) on (restaurant, name) in batches.
+    Invalid or repeated rows are skipped and reported with their 1-based row
+    number. The import is one transaction: if reading `rows` fails part way,
+    nothing is written.
+    """
+    existing = set(restaurant.restaurant_menuitems.values_list('name', flat=True))
+    seen = set()
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    batch = []
+    for number, row in enumerate(rows, start=1):
+        serializer = MenuItemImportSerializer(data=row)
+        if not serializer.is_valid():
+            result['errors'].append({'row': number, 'errors': serializer.errors})
+            continue
+        name = serializer.validated_data['name']
+        if name in seen:
+            result['errors'].append({'row': number, 'errors': {'name': ['Duplicate name in this file.']}})
+            continue
+        seen.add(name)
+        result['updated' if name in existing else 'created'] += 1
+        batch.append(MenuItem(restaurant=restaurant, **serializer.validated_data))
+        if len(batch) >= batch_size:
+            upsert_menu_items(batch)
+            batch = []
+    if batch:
+        upsert_menu_items(batch)
+    # bulk_create sends no signals, so the cached menu and availability are dropped here instead.
+    transaction.on_commit(lambda: invalidate_restaurant_menu(restaurant.pk))
+    transaction.on_commit(invalidate_unavailable_ids)
+    return result
+
+
+def upsert_menu_items(items):
+    MenuItem.objects.bulk_create(
+        items,
+        update_conflicts=True,
+        unique_fields=['restaurant', 'name'],
+        update_fields=UPSERT_FIELDS,
+    )
+
+
+class Echo:
+    # csv.writer target that hands each formatted line straight back.
+    def write(self, value):
+        return value
+
+
+def export_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(MENU_FIELDS)
+    for row in queryset.values_list(*MENU_FIELDS).iterator(chunk_size=2000):
+        yield writer.writerow(row)
+
+
+def export_json(queryset):
+    yield '['
+    separator = ''
+    for row in queryset.values(*MENU_FIELDS).iterator(chunk_size=2000):
+        row['price'] = str(row['price'])
+        yield separator + json.dumps(row)
+        separator = ','
+    yield ']'
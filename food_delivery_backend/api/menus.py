@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import MenuItem, Restaurant
+from .stock import unavailable_menu_item_ids
+
+
+def _cache():
+    return caches[settings.MENU_CACHE_ALIAS]
+
+
+def menu_cache_key(restaurant_id):
+    return f'restaurant-menu:{restaurant_id}'
+
+
+def build_restaurant_menu(restaurant):
+    # All items grouped by MenuItem.Category, in the order categories are declared.
+    # Availability changes with every order, so it is applied when the menu is read.
+    # Serializers are imported here so the signal handlers can load this module
+    # at startup without pulling in DRF.
+    from .serializers import RestaurantMenuItemSerializer, RestaurantSerializer
+
+    grouped = {key: [] for key, _ in MenuItem.Category}
+    for item in restaurant.restaurant_menuitems.order_by('name'):
+        grouped[item.category].append(RestaurantMenuItemSerializer(item).data)
+    return {
+        'restaurant': RestaurantSerializer(restaurant).data,
+        'categories': [
+            {'category': key, 'label': label, 'items': grouped[key]}
+            for key, label in MenuItem.Category
+            if grouped[key]
+        ],
+    }
+
+
+def get_restaurant_menu(restaurant_id):
+    """
+    Return the menu of items that can be ordered now, or None if the restaurant
+    does not exist. Documents are cached until `invalidate_restaurant_menu` is
+    called for the restaurant or MENU_CACHE_TIMEOUT passes, and are filtered
+    with the cached set of unavailable items, so a warm read is two cache lookups.
+    """
+    key = menu_cache_key(restaurant_id)
+    menu = _cache().get(key)
+    if menu is None:
+        restaurant = Restaurant.objects.filter(pk=restaurant_id).first()
+        if restaurant is None:
+            return None
+        menu = build_restaurant_menu(restaurant)
+        _cache().set(key, menu, timeout=settings.MENU_CACHE_TIMEOUT)
+    return available_menu(menu)
+
+
+def available_menu(menu):
+    unavailable = unavailable_menu_item_ids()
+    categories = []
+    for category in menu['categories']:
+        items = [item for item in category['items'] if item['id'] not in unavailable]
+        if items:
+            categories.append({**category, 'items': items})
+    return {**menu, 'categories': categories}
+
+
+def invalidate_restaurant_menu(restaurant_id):
+    _cache().delete(menu_cache_key(restaurant_id))
@@ -0,0 +1,48 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .db_routers import allow_replica_reads
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def sticky_cache_key(request):
+    # JWT requests carry no session, so the client is identified by its
+    # Authorization header (or its address when anonymous).
+    ident = request.headers.get('Authorization') or request.META.get('REMOTE_ADDR', '')
+    return 'db-sticky:' + hashlib.sha1(ident.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Allow replica reads for safe requests. After a successful write to one of
+    DATABASE_STICKY_URL_NAMES the same client reads from the primary for
+    DATABASE_STICKY_SECONDS, so it sees its own cart and order changes even
+    while replicas lag behind.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'DATABASE_REPLICAS', []):
+            return self.get_response(request)
+
+        cache = caches[settings.DATABASE_STICKY_CACHE_ALIAS]
+        key = sticky_cache_key(request)
+        safe = request.method in SAFE_METHODS
+        with allow_replica_reads(safe and not cache.get(key)):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        if (
+            not safe
+            and response.status_code < 400
+            and match is not None
+            and match.url_name in settings.DATABASE_STICKY_URL_NAMES
+        ):
+            cache.set(key, True, timeout=settings.DATABASE_STICKY_SECONDS)
+        return response
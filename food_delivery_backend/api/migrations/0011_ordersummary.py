@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('last_order_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('item_counts', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
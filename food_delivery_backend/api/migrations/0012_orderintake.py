@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_ordersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIntake',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processed', 'Processed'), ('rejected', 'Rejected')], default='queued', max_length=20)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='intake', to='api.order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_intakes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='api_intake_status_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='daily_cap',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='sold_on',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='sold_today',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
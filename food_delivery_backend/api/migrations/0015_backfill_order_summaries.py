@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:33
+
+from collections import Counter
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def backfill(apps, schema_editor):
+    # Orders placed before 0011 have no summary rows yet. Mirrors
+    # api.summaries.rebuild_order_summaries, but on the historical models so
+    # later changes to the live ones cannot break a fresh migrate.
+    def model(name):
+        return apps.get_model('api', name)
+
+    stats = {}
+
+    def entry(user_id):
+        return stats.setdefault(user_id, {'count': 0, 'spend': Decimal('0.00'), 'last': None, 'items': Counter()})
+
+    for name in ('Order', 'ArchivedOrder'):
+        for user_id, order_id, created_at in model(name).objects.order_by().values_list('user_id', 'id', 'created_at'):
+            data = entry(user_id)
+            data['count'] += 1
+            if data['last'] is None or created_at >= data['last'][1]:
+                data['last'] = (order_id, created_at)
+    for name in ('Transaction', 'ArchivedTransaction'):
+        rows = model(name).objects.filter(status='success').order_by().values('user_id').annotate(total=Sum('amount_due'))
+        for row in rows:
+            entry(row['user_id'])['spend'] += row['total']
+    for name in ('OrderItem', 'ArchivedOrderItem'):
+        rows = (
+            model(name).objects.filter(menu_item__isnull=False).order_by()
+            .values('order__user_id', 'menu_item_id').annotate(quantity=Sum('quantity'))
+        )
+        for row in rows:
+            entry(row['order__user_id'])['items'][row['menu_item_id']] += row['quantity']
+
+    OrderSummary = model('OrderSummary')
+    OrderSummary.objects.bulk_create(
+        [
+            OrderSummary(
+                user_id=user_id,
+                order_count=data['count'],
+                lifetime_spend=data['spend'],
+                last_order_id=data['last'][0] if data['last'] else None,
+                last_order_at=data['last'][1] if data['last'] else None,
+                item_counts={str(k): v for k, v in data['items'].items()},
+            )
+            for user_id, data in stats.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['order_count', 'lifetime_spend', 'last_order_id', 'last_order_at', 'item_counts', 'updated_at'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_menuitem_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
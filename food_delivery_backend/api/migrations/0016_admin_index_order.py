@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:35
+
+from django.db import migrations, models
+
+
+# Case-insensitive prefix indexes for the admin's `name__istartswith` searches.
+# SQLite runs istartswith as LIKE, which only uses a NOCASE index; Postgres runs
+# it as UPPER(name) LIKE, which needs a pattern-ops index on that expression.
+NAME_INDEXES = [('api_restaurant_name_prefix', 'api_restaurant'), ('api_menuitem_name_prefix', 'api_menuitem')]
+
+
+def create_name_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        column = 'name COLLATE NOCASE'
+    elif vendor == 'postgresql':
+        column = 'UPPER(name) text_pattern_ops'
+    else:
+        return
+    for index, table in NAME_INDEXES:
+        schema_editor.execute(f'CREATE INDEX {index} ON {table} ({column})')
+
+
+def drop_name_indexes(apps, schema_editor):
+    for index, table in NAME_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_backfill_order_summaries'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='menuitem',
+            name='api_menuitem_category_avail',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='api_order_status_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='api_transaction_status_created',
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['category', 'available', '-id'], name='api_menuitem_category_avail_id'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-id'], name='api_order_status_id'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', '-id'], name='api_transaction_status_id'),
+        ),
+        migrations.RunPython(create_name_indexes, drop_name_indexes),
+    ]
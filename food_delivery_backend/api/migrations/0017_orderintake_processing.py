@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_admin_index_order'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderintake',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('processed', 'Processed'), ('rejected', 'Rejected')], default='queued', max_length=20),
+        ),
+    ]
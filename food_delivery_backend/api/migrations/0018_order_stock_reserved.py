@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+def mark_holding_orders(apps, schema_editor):
+    # Pending and ready orders placed since 0014 hold the stock their lines reserved.
+    apps.get_model('api', 'Order').objects.filter(status__in=['pending', 'ready']).update(stock_reserved=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_orderintake_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_holding_orders, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
-from django.core.validators import MinValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
+
+from .geo import encode_geohash
 
 
 class CustomUser(AbstractUser):
@@ -28,12 +31,33 @@ class Restaurant(models.Model):
     name = models.CharField(max_length=255, unique=True)
     profile_picture = models.ImageField(upload_to="restaurants/profilepictures/", blank=True, null=True)
     location = models.CharField(max_length=255)
+    latitude = models.FloatField(
+        blank=True, null=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        blank=True, null=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    # Derived from latitude/longitude; nearby searches range-scan its prefixes.
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True, editable=False)
     description = models.TextField(max_length=255, blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['name']
+
+    def update_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ""
+        else:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geohash"}
+        super().save(*args, **kwargs)
         
     def __str__(self):
         return self.name
@@ -62,12 +86,24 @@ class MenuItem(models.Model):
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to="images/menu/", default='default_images/default_profile_picture.jpg', null=True, blank=True)
     available = models.BooleanField(default=True)
+    # Optional limits; None means untracked. sold_today counts towards daily_cap
+    # and restarts when sold_on is not today.
+    stock = models.PositiveIntegerField(blank=True, null=True)
+    daily_cap = models.PositiveIntegerField(blank=True, null=True)
+    sold_today = models.PositiveIntegerField(default=0, editable=False)
+    sold_on = models.DateField(blank=True, null=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        if self.stock == 0:
+            self.available = False
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["-updated_at", "-created_at"]
         unique_together = ['restaurant', 'name']
+        indexes = [models.Index(fields=["category", "available", "-id"], name="api_menuitem_category_avail_id")]
 
     def __str__(self):
         return self.name
@@ -99,21 +135,27 @@ class Order(models.Model):
     payment_methods = models.CharField(
         max_length=20, choices=PaymentMethods, default="mobile_money"
     )
+    # Whether the stock its lines reserved is still held (see api/stock.py).
+    # Cleared exactly once: when that stock is given back or the order is delivered.
+    stock_reserved = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def calculate_total_price(self):
+        if not self.pk:
+            return 0
         return sum(item.subtotal for item in self.orderitems.all())
 
-    def save(self):
+    def save(self, *args, **kwargs):
         self.total_price = self.calculate_total_price()
-        super().save()
+        super().save(*args, **kwargs)
 
     class Meta:
         ordering = ["-updated_at", "-created_at"]
+        indexes = [models.Index(fields=["status", "-id"], name="api_order_status_id")]
 
     def __str__(self):
-        return f"Order {self.id} by {self.user.username} ({self.status})"
+        return f"Order {self.id} by {self.user.email} ({self.status})"
 
 
 class OrderItem(models.Model):
@@ -128,10 +170,10 @@ class OrderItem(models.Model):
         max_digits=10, decimal_places=2, validators=[MinValueValidator(0.00)]
     )
 
-    def save(self):
+    def save(self, *args, **kwargs):
         if self.menu_item:
             self.ordered_price = self.menu_item.price
-        super().save()
+        super().save(*args, **kwargs)
 
     @property
     def subtotal(self):
@@ -142,7 +184,8 @@ class OrderItem(models.Model):
 
     def __str__(self):
         # 5x Burgers - Order 22
-        return f"{self.quantity}x {self.menu_item.name} - Order #{self.order.id}"
+        menu_item = self.menu_item.name if self.menu_item_id else "removed item"
+        return f"{self.quantity}x {menu_item} - Order #{self.order_id}"
 
 
 class Cart(models.Model):
@@ -154,17 +197,19 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def calculate_total_price(self):
+        if not self.pk:
+            return 0
         return sum(item.subtotal for item in self.cartitems.all())
 
-    def save(self):
+    def save(self, *args, **kwargs):
         self.total_price = self.calculate_total_price()
-        super().save()
+        super().save(*args, **kwargs)
 
     class Meta:
         ordering = ["-updated_at", "-created_at"]
 
     def __str__(self):
-        return f"Cart {self.id} by {self.user.username}"
+        return f"Cart {self.id} by {self.user.email}"
 
 
 class CartItem(models.Model):
@@ -178,20 +223,21 @@ class CartItem(models.Model):
     def subtotal(self):
         return self.quantity * self.menu_item.price
 
-    def save(self):
-        super().save()
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
         self.cart.save() # update cart with any updates that might happen such as price changes.
         
-    def delete(self):
+    def delete(self, *args, **kwargs):
         this_cart = self.cart # we first assign the cart becoz it might not exist after delete yet we need it to update the Cart model.
-        super().delete()
+        result = super().delete(*args, **kwargs)
         this_cart.save() #Update Cart with deleted item
+        return result
 
     class Meta:
         ordering = ["-cart__updated_at"]
 
     def __str__(self):
-        return f"{self.quantity}x {self.menu_item.name} - Cart #{self.cart.id}"
+        return f"{self.quantity}x {self.menu_item.name} - Cart #{self.cart_id}"
 
 
 class Transaction(models.Model):
@@ -211,17 +257,184 @@ class Transaction(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
-    def save(self):
+    def save(self, *args, **kwargs):
         if not self.pk and self.order:
-            self.order_id = self.order.id
+            self.ordered_id = self.order.id
             self.amount_due = self.order.total_price
             self.payment_method = self.order.payment_methods
-            self.user = self.order.user.id
-        super().save()
+            self.user_id = self.order.user_id
+        super().save(*args, **kwargs)
         
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "-id"], name="api_transaction_status_id")]
 
     def __str__(self):
         return f"Transaction {self.id} - Order ID {self.order_id} on {self.created_at}"
+
+
+
+class IdempotencyKey(models.Model):
+    # One row per (user, endpoint, Idempotency-Key header). status_code stays
+    # empty while the first request is still running.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys"
+    )
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "scope", "key"], name="unique_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} by {self.user_id}"
+
+
+
+# Archive tables. Rows keep the id they had in the live table so history
+# links and receipts stay valid after `archive_orders` moves them here.
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_orders"
+    )
+    status = models.CharField(max_length=20, choices=Order.Status)
+    total_price = models.DecimalField(max_digits=11, decimal_places=2)
+    payment_methods = models.CharField(max_length=20, choices=Order.PaymentMethods)
+    updated_at = models.DateTimeField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-updated_at", "-created_at"]
+
+    def __str__(self):
+        return f"Archived order {self.id} ({self.status})"
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder, related_name="orderitems", on_delete=models.CASCADE
+    )
+    menu_item = models.ForeignKey(
+        MenuItem, related_name="archived_order_menuitems", on_delete=models.SET_NULL, null=True
+    )
+    quantity = models.PositiveIntegerField()
+    ordered_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    @property
+    def subtotal(self):
+        return self.quantity * self.ordered_price
+
+    def __str__(self):
+        return f"{self.quantity}x item {self.menu_item_id} - Archived order #{self.order_id}"
+
+
+class ArchivedTransaction(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder, related_name="transactions", on_delete=models.SET_NULL, null=True
+    )
+    ordered_id = models.PositiveIntegerField()
+    amount_due = models.DecimalField(decimal_places=2, max_digits=11)
+    payment_method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=Transaction.Status)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_transactions"
+    )
+    updated_at = models.DateTimeField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Archived transaction {self.id} - Order ID {self.order_id}"
+
+
+
+class RequestProfile(models.Model):
+    # One profiled request (see api/profiling.py). `stats` is a marshalled
+    # pstats dump; `sql_log` lists every query with its timing and origin.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="request_profiles"
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql_duration_ms = models.FloatField()
+    stats = models.BinaryField()
+    sql_log = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f}ms)"
+
+
+
+class OrderSummary(models.Model):
+    # Per-user order statistics kept up to date by api/summaries.py, so the
+    # profile screen never aggregates over the order tables.
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="order_summary"
+    )
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=13, decimal_places=2, default=0)
+    # Plain ids: the order may since have moved to the archive tables.
+    last_order_id = models.PositiveBigIntegerField(blank=True, null=True)
+    last_order_at = models.DateTimeField(blank=True, null=True)
+    # {menu_item_id: quantity ever ordered}
+    item_counts = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def favorite_item_ids(self, limit=5):
+        ranked = sorted(self.item_counts.items(), key=lambda pair: pair[1], reverse=True)
+        return [(int(menu_item_id), quantity) for menu_item_id, quantity in ranked[:limit] if quantity > 0]
+
+    def __str__(self):
+        return f"Order summary for {self.user_id}"
+
+
+
+class OrderIntake(models.Model):
+    # Orders accepted by POST /orders/intake/ and turned into Order/OrderItem/
+    # Transaction rows later, in batches, by `manage.py process_order_intake`.
+    # payload: {"payment_methods": ..., "items": [{"menu_item": id, "quantity": n}, ...]}
+    Status = [
+        ("queued", "Queued"),
+        # Only ever seen inside the transaction of the batch that claimed it.
+        ("processing", "Processing"),
+        ("processed", "Processed"),
+        ("rejected", "Rejected"),
+    ]
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="order_intakes"
+    )
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=Status, default="queued")
+    error = models.CharField(max_length=255, blank=True, default="")
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="intake")
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "id"], name="api_intake_status_id")]
+
+    def __str__(self):
+        return f"Intake {self.id} by {self.user_id} ({self.status})"
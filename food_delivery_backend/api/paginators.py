@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using):
+    # Planner statistics instead of a full scan; only Postgres keeps them cheaply.
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # reltuples is -1 (or 0 on older servers) until the table has been analyzed.
+    return row[0] if row and row[0] > 0 else None
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Avoids COUNT(*) over whole tables: unfiltered lists use the planner's row
+    estimate once it passes ADMIN_EXACT_COUNT_LIMIT, and any other count stops
+    at that limit, so only the first pages up to it can be reached.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
@@ -0,0 +1,152 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import time
+import traceback
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import connections
+
+from .models import RequestProfile
+
+
+TOKEN_SALT = 'api.profiling'
+HEADER = 'X-Profile-Token'
+QUERY_PARAM = '_profile'
+
+
+def make_profiling_token(user):
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def profiling_user(request):
+    """The staff user a valid profiling token in `request` was issued to, or None."""
+    token = request.headers.get(HEADER) or request.GET.get(QUERY_PARAM)
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.REQUEST_PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(pk=data.get('user'), is_staff=True, is_active=True).first()
+
+
+DJANGO_DIR = os.path.dirname(django.__file__)
+
+
+def query_origin(depth=6):
+    # The innermost frames that led to the query, leaving out Django's own ORM
+    # and request plumbing and this module.
+    frames = [
+        f'{frame.filename}:{frame.lineno} in {frame.name}'
+        for frame in traceback.extract_stack()[:-2]
+        if not frame.filename.startswith(DJANGO_DIR) and frame.filename != __file__
+    ]
+    return frames[-depth:]
+
+
+class SqlRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': repr(params)[:1000],
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                'origin': query_origin(),
+            })
+
+
+def stored_path(request):
+    # The token is a reusable credential, so it is not kept with the capture.
+    query = request.GET.copy()
+    query.pop(QUERY_PARAM, None)
+    return f'{request.path}?{query.urlencode()}' if query else request.path
+
+
+def store_profile(request, response, user, profiler, queries, duration_ms):
+    profiler.create_stats()
+    profile = RequestProfile.objects.create(
+        user=user,
+        method=request.method,
+        path=stored_path(request)[:500],
+        status_code=response.status_code,
+        duration_ms=duration_ms,
+        query_count=len(queries),
+        sql_duration_ms=sum(query['duration_ms'] for query in queries),
+        stats=marshal.dumps(profiler.stats),
+        sql_log=queries,
+    )
+    # Keep only the newest REQUEST_PROFILING_BUFFER_SIZE captures.
+    cutoff = (
+        RequestProfile.objects.order_by('-id')
+        .values_list('id', flat=True)[settings.REQUEST_PROFILING_BUFFER_SIZE:settings.REQUEST_PROFILING_BUFFER_SIZE + 1]
+        .first()
+    )
+    if cutoff is not None:
+        RequestProfile.objects.filter(id__lte=cutoff).delete()
+    return profile
+
+
+class StoredStats:
+    # Lets pstats.Stats load a marshalled dump from memory instead of a file.
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+def stats_text(profile, limit=40):
+    """Cumulative-time listing of a stored profile, as printed by pstats."""
+    output = io.StringIO()
+    pstats.Stats(StoredStats(profile.stats), stream=output).sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile a single request when it carries a profiling token issued to a staff
+    user (`manage.py profiling_token`), in the X-Profile-Token header or the
+    `_profile` query parameter. The cProfile stats and every SQL query with its
+    timing and origin are saved as a RequestProfile, downloadable from the admin.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            return self.get_response(request)
+        user = profiling_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        recorder = SqlRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+
+        profile = store_profile(request, response, user, profiler, recorder.queries, duration_ms)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Restaurant, MenuItem, Order, OrderItem, Cart, CartItem, Transaction
+from .stock import unavailable_menu_item_ids
+from .models import Restaurant, MenuItem, Order, OrderItem, Cart, CartItem, Transaction, ArchivedOrder, ArchivedOrderItem, ArchivedTransaction, OrderSummary, OrderIntake
 
 
 class RegisterUserSerializer(serializers.ModelSerializer):
@@ -28,16 +29,63 @@ class CustomUserSerializer(serializers.ModelSerializer):
 class RestaurantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Restaurant
-        fields = ['id', 'name', 'location', 'description', 'profile_picture','created_at', 'updated_at']
+        fields = ['id', 'name', 'location', 'latitude', 'longitude', 'description', 'profile_picture','created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError("Latitude and longitude must be set together")
+        return attrs
+
+class NearbyRestaurantSerializer(RestaurantSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(RestaurantSerializer.Meta):
+        fields = RestaurantSerializer.Meta.fields + ['distance_km']
+
+class NearbyQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0.1, max_value=100, default=5)
+    limit = serializers.IntegerField(min_value=1, max_value=200, default=50)
+
 class MenuItemSerializer(serializers.ModelSerializer):
     restaurant = RestaurantSerializer(read_only=True)
     class Meta:
         model = MenuItem
-        fields = ['id', 'restaurant', 'name', 'category', 'price', 'description', 'image', 'available', 'created_at', 'updated_at']
+        fields = ['id', 'restaurant', 'name', 'category', 'price', 'description', 'image', 'available', 'stock', 'daily_cap', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate(self, attrs):
+        # Restocking a sold-out item puts it back on sale unless the request says otherwise.
+        if attrs.get('stock') and 'available' not in attrs and self.instance is not None and self.instance.stock == 0:
+            attrs['available'] = True
+        return attrs
+
+    def to_representation(self, instance):
+        # `available` is whether the item can be ordered now. The cached set is
+        # fetched once per response; list children share the root's context.
+        data = super().to_representation(instance)
+        if 'unavailable_ids' not in self.context:
+            self.context['unavailable_ids'] = unavailable_menu_item_ids()
+        data['available'] = data['available'] and instance.pk not in self.context['unavailable_ids']
+        return data
+
+class RestaurantMenuItemSerializer(serializers.ModelSerializer):
+    # Menu entries are nested under their restaurant, so they leave it out.
+    class Meta:
+        model = MenuItem
+        fields = ['id', 'name', 'category', 'price', 'description', 'image', 'available', 'updated_at']
+        read_only_fields = fields
+
+class MenuItemImportSerializer(serializers.ModelSerializer):
+    # One row of a bulk menu import; the restaurant comes from the URL.
+    class Meta:
+        model = MenuItem
+        fields = ['name', 'category', 'price', 'description', 'available']
+
 class OrderItemSerializer(serializers.ModelSerializer):
     menu_item_name = serializers.CharField(source='menu_item.name', read_only=True)
     subtotal = serializers.DecimalField(max_digits=7, decimal_places=2, read_only=True)
@@ -53,8 +101,61 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'status', 'total_price', 'payment_method', 'orderitems', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'total_price', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'status', 'total_price', 'payment_methods', 'orderitems', 'created_at', 'updated_at']
+        # Status is moved by settlement and staff, not by the customer.
+        read_only_fields = ['id', 'user', 'status', 'total_price', 'created_at', 'updated_at']
+
+class OrderHeaderSerializer(serializers.ModelSerializer):
+    # Order without its lines; the view adds `orderitems` only when expanded.
+    user = serializers.StringRelatedField(read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'user', 'status', 'total_price', 'payment_methods', 'item_count', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class ExpandedOrderHeaderSerializer(OrderHeaderSerializer):
+    orderitems = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta(OrderHeaderSerializer.Meta):
+        fields = OrderHeaderSerializer.Meta.fields + ['orderitems']
+        read_only_fields = fields
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    favorite_items = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderSummary
+        fields = ['order_count', 'lifetime_spend', 'last_order_id', 'last_order_at', 'favorite_items']
+        read_only_fields = fields
+
+    def get_favorite_items(self, summary):
+        favorites = summary.favorite_item_ids()
+        names = dict(MenuItem.objects.filter(pk__in=[pk for pk, _ in favorites]).values_list('pk', 'name'))
+        return [
+            {'menu_item': pk, 'menu_item_name': names[pk], 'quantity': quantity}
+            for pk, quantity in favorites
+            if pk in names
+        ]
+
+class OrderIntakeItemSerializer(serializers.Serializer):
+    menu_item = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=100)
+
+class OrderIntakeSerializer(serializers.ModelSerializer):
+    # Shape checks only; menu items are looked up when the intake is processed.
+    payment_methods = serializers.ChoiceField(choices=Order.PaymentMethods, default="mobile_money", write_only=True)
+    items = OrderIntakeItemSerializer(many=True, write_only=True, allow_empty=False, max_length=50)
+
+    class Meta:
+        model = OrderIntake
+        fields = ['id', 'status', 'error', 'order', 'payment_methods', 'items', 'created_at', 'processed_at']
+        read_only_fields = ['id', 'status', 'error', 'order', 'created_at', 'processed_at']
+
+    def create(self, validated_data):
+        payload = {'payment_methods': validated_data.pop('payment_methods'), 'items': validated_data.pop('items')}
+        return OrderIntake.objects.create(payload=payload, **validated_data)
 
 class CartItemSerializer(serializers.ModelSerializer):
     menu_item_name = serializers.CharField(source='menu_item.name', read_only=True)
@@ -63,7 +164,7 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['id', 'cart', 'menu_item', 'menu_item_name', 'quantity', 'subtotal']
-        read_only_fields = ['id', 'subtotal']
+        read_only_fields = ['id', 'cart', 'subtotal']
 
 class CartSerializer(serializers.ModelSerializer):
     cartitems = CartItemSerializer(many=True, read_only=True)
@@ -80,5 +181,34 @@ class TransactionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Transaction
-        fields = ['id', 'order', 'order_id', 'amount_due', 'payment_method', 'status', 'user', 'items', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'order_id', 'amount_due', 'user', 'items', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'order', 'order_id', 'amount_due', 'payment_method', 'status', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'order_id', 'amount_due', 'payment_method', 'user', 'created_at', 'updated_at']
+        extra_kwargs = {'order': {'required': True, 'allow_null': False}}
+
+
+# Archive serializers mirror the live ones so clients can render history the same way.
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    menu_item_name = serializers.CharField(source='menu_item.name', read_only=True, default=None)
+    subtotal = serializers.DecimalField(max_digits=7, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ['id', 'order', 'menu_item', 'menu_item_name', 'quantity', 'ordered_price', 'subtotal']
+        read_only_fields = fields
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    orderitems = ArchivedOrderItemSerializer(many=True, read_only=True)
+    user = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'user', 'status', 'total_price', 'payment_methods', 'orderitems', 'created_at', 'updated_at', 'archived_at']
+        read_only_fields = fields
+
+class ArchivedTransactionSerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = ArchivedTransaction
+        fields = ['id', 'order', 'order_id', 'amount_due', 'payment_method', 'status', 'user', 'created_at', 'updated_at', 'archived_at']
+        read_only_fields = fields
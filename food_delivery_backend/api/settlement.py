@@ -0,0 +1,140 @@
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Order, Transaction
+from .stock import release_order_stock
+from .summaries import record_spend
+
+
+logger = logging.getLogger(__name__)
+
+SETTLED_STATUSES = ('success', 'failed')
+
+
+class PaymentProvider:
+    """
+    Interface to a payment provider. `fetch_statuses` receives a batch of
+    pending payments as dicts (id, order_id, user_id, amount_due,
+    payment_method) and returns {transaction id: 'success' | 'failed' | 'pending'}.
+    Ids left out are treated as still pending. It runs on worker threads and
+    must not touch the database.
+    """
+
+    def fetch_statuses(self, payments):
+        raise NotImplementedError
+
+
+class FakePaymentProvider(PaymentProvider):
+    """Local provider: every payment gets `outcome` unless listed in `overrides`."""
+
+    def __init__(self, outcome='success', overrides=None):
+        self.outcome = outcome
+        self.overrides = overrides or {}
+
+    def fetch_statuses(self, payments):
+        return {payment['id']: self.overrides.get(payment['id'], self.outcome) for payment in payments}
+
+
+def get_payment_provider():
+    if not settings.PAYMENT_PROVIDER:
+        raise ImproperlyConfigured("PAYMENT_PROVIDER is not set.")
+    return import_string(settings.PAYMENT_PROVIDER)()
+
+
+def pending_batches(batch_size):
+    # Keyset pagination, so rows settled while we go are never re-read or skipped.
+    pending = (
+        Transaction.objects.filter(status='pending')
+        .order_by('id')
+        .values('id', 'order_id', 'user_id', 'amount_due', 'payment_method')
+    )
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]['id']
+
+
+@transaction.atomic
+def apply_statuses(batch, statuses):
+    """Write one batch of provider results. Returns a Counter of outcomes."""
+    outcome = Counter()
+    by_status = defaultdict(list)
+    for payment in batch:
+        status = statuses.get(payment['id'], 'pending')
+        if status in SETTLED_STATUSES:
+            by_status[status].append(payment)
+        else:
+            outcome['pending'] += 1
+    if not by_status:
+        return outcome
+
+    # Only rows still pending now are settled here; anything changed meanwhile is left alone.
+    still_pending = set(
+        Transaction.objects.select_for_update()
+        .filter(id__in=[p['id'] for payments in by_status.values() for p in payments], status='pending')
+        .values_list('id', flat=True)
+    )
+    now = timezone.now()
+    spend = defaultdict(int)
+    for status, payments in by_status.items():
+        payments = [p for p in payments if p['id'] in still_pending]
+        Transaction.objects.filter(id__in=[p['id'] for p in payments]).update(status=status, updated_at=now)
+        order_ids = [p['order_id'] for p in payments if p['order_id'] is not None]
+        orders = Order.objects.filter(id__in=order_ids, status='pending')
+        order_status = settings.SETTLEMENT_ORDER_STATUSES[status]
+        if order_status == 'cancelled':
+            release_order_stock(list(orders.values_list('id', flat=True)))
+        orders.update(status=order_status, updated_at=now)
+        if status == 'success':
+            for payment in payments:
+                spend[payment['user_id']] += payment['amount_due']
+        outcome[status] += len(payments)
+    # Queryset updates send no signals, so order summaries and stock are updated here.
+    record_spend(spend)
+    return outcome
+
+
+def settle_pending_transactions(provider=None, batch_size=None, max_workers=None):
+    """
+    Reconcile every pending transaction against the payment provider. Batches
+    are sent to the provider from a pool of at most `max_workers` threads, with
+    no more than that many batches in flight; results are written from the
+    calling thread with one bulk update per status. Successful payments mark
+    their order with SETTLEMENT_ORDER_STATUSES['success'], failed ones with
+    SETTLEMENT_ORDER_STATUSES['failed']. Returns a Counter of outcomes.
+    """
+    provider = provider or get_payment_provider()
+    batch_size = batch_size or settings.SETTLEMENT_BATCH_SIZE
+    max_workers = max_workers or settings.SETTLEMENT_MAX_WORKERS
+    totals = Counter()
+
+    def collect(futures):
+        for future in futures:
+            batch = in_flight.pop(future)
+            try:
+                statuses = future.result()
+            except Exception:
+                logger.exception("Payment provider failed for %d transactions; leaving them pending", len(batch))
+                totals['errors'] += len(batch)
+                continue
+            totals.update(apply_statuses(batch, statuses))
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for batch in pending_batches(batch_size):
+            if len(in_flight) >= max_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[pool.submit(provider.fetch_statuses, batch)] = batch
+        collect(list(in_flight))
+    return totals
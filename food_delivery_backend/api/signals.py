@@ -0,0 +1,113 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .menus import invalidate_restaurant_menu
+from .stock import HOLDING_STATUSES, invalidate_unavailable_ids, release_order_stock, reserve_order_stock
+from .models import MenuItem, Order, OrderItem, Restaurant, Transaction
+from .summaries import forget_orders, record_items, record_orders, record_spend, summary_updates_suspended
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    # Dropped after commit so a concurrent rebuild cannot cache the old rows again.
+    transaction.on_commit(lambda: invalidate_restaurant_menu(instance.restaurant_id))
+    transaction.on_commit(invalidate_unavailable_ids)
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def restaurant_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_restaurant_menu(instance.pk))
+
+
+# Stock reserved by an order goes back once when it is cancelled or deleted
+# unfulfilled, is used up on delivery, and is taken again if it is un-cancelled.
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._stock_status = instance.__dict__.get('status') if instance.__dict__.get('id') else None
+
+
+@receiver(post_save, sender=Order)
+def order_status_saved(sender, instance, created, **kwargs):
+    previous, instance._stock_status = instance._stock_status, instance.status
+    if instance.status == 'cancelled':
+        release_order_stock([instance.pk])
+    elif instance.status == 'delivered':
+        Order.objects.filter(pk=instance.pk).update(stock_reserved=False)
+    elif previous == 'cancelled' and instance.status in HOLDING_STATUSES:
+        reserve_order_stock(instance.pk)
+    else:
+        return
+    # Keep this instance in step, so its next save() does not write the old flag back.
+    instance.stock_reserved = instance.status in HOLDING_STATUSES
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleting(sender, instance, **kwargs):
+    # Before the cascade removes the lines that say what was reserved.
+    release_order_stock([instance.pk])
+
+
+# Order summaries. post_init remembers what a row looked like when it was loaded
+# (reading __dict__ so deferred fields are not fetched) so saves apply only the change.
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    if created and not summary_updates_suspended():
+        record_orders([instance])
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    if not summary_updates_suspended():
+        forget_orders([instance])
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_order_item(sender, instance, **kwargs):
+    if instance.__dict__.get('id') is None:
+        instance._summary_state = (None, 0)
+    else:
+        instance._summary_state = (instance.__dict__.get('menu_item_id'), instance.__dict__.get('quantity') or 0)
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, **kwargs):
+    if summary_updates_suspended():
+        return
+    old_menu_item_id, old_quantity = instance._summary_state
+    deltas = Counter()
+    if old_menu_item_id is not None:
+        deltas[old_menu_item_id] -= old_quantity
+    if instance.menu_item_id is not None:
+        deltas[instance.menu_item_id] += instance.quantity
+    record_items({instance.order.user_id: deltas})
+    instance._summary_state = (instance.menu_item_id, instance.quantity)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    if summary_updates_suspended() or instance.menu_item_id is None:
+        return
+    record_items({instance.order.user_id: {instance.menu_item_id: -instance.quantity}})
+
+
+@receiver(post_init, sender=Transaction)
+def remember_transaction(sender, instance, **kwargs):
+    if instance.__dict__.get('id') is None:
+        instance._summary_paid = None
+    elif instance.__dict__.get('status') == 'success':
+        instance._summary_paid = instance.__dict__.get('amount_due')
+    else:
+        instance._summary_paid = None
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, **kwargs):
+    if summary_updates_suspended():
+        return
+    paid = instance.amount_due if instance.status == 'success' else None
+    if paid != instance._summary_paid:
+        record_spend({instance.user_id: (paid or 0) - (instance._summary_paid or 0)})
+    instance._summary_paid = paid
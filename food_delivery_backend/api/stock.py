@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import MenuItem, Order, OrderItem
+
+
+UNAVAILABLE_KEY = 'menu-unavailable:{}'
+
+
+# Orders in these statuses hold the stock their lines reserved.
+HOLDING_STATUSES = ('pending', 'ready')
+
+
+def _cache():
+    return caches[settings.STOCK_CACHE_ALIAS]
+
+
+class OutOfStock(Exception):
+    def __init__(self, menu_item_ids):
+        self.menu_item_ids = sorted(menu_item_ids)
+        super().__init__(f"Out of stock: {self.menu_item_ids}")
+
+
+def sellable(quantity, today):
+    # Rows that can sell `quantity` more today, as a filter the UPDATE itself checks.
+    within_cap = (
+        Q(daily_cap__isnull=True)
+        | Q(sold_on=today, sold_today__lte=F('daily_cap') - quantity)
+        | (~Q(sold_on=today) & Q(daily_cap__gte=quantity))
+    )
+    return Q(available=True) & (Q(stock__isnull=True) | Q(stock__gte=quantity)) & within_cap
+
+
+def reserve_stock(quantities):
+    """
+    Take {menu_item_id: quantity} off stock and today's caps with one
+    conditional UPDATE per item, so concurrent orders cannot oversell. Items
+    whose stock reaches zero are marked unavailable. All or nothing: raises
+    OutOfStock with the items that could not be served.
+    """
+    today = timezone.localdate()
+    short = []
+    with transaction.atomic():
+        # A fixed order keeps concurrent reservations from deadlocking on row locks.
+        for menu_item_id, quantity in sorted(quantities.items()):
+            updated = MenuItem.objects.filter(sellable(quantity, today), pk=menu_item_id).update(
+                stock=F('stock') - quantity,
+                available=Case(When(stock=quantity, then=Value(False)), default=Value(True)),
+                sold_today=Case(When(sold_on=today, then=F('sold_today') + quantity), default=Value(quantity)),
+                sold_on=today,
+            )
+            if not updated:
+                short.append(menu_item_id)
+        if short:
+            raise OutOfStock(short)
+        if MenuItem.objects.filter(pk__in=quantities).exclude(sellable(1, today)).exists():
+            transaction.on_commit(invalidate_unavailable_ids)
+
+
+def release_stock(quantities):
+    """
+    Give {menu_item_id: quantity} back to stock and today's caps, for orders
+    that will not be fulfilled after all. Items that went unavailable because
+    their stock ran out are put back on sale; switched-off items stay off.
+    """
+    today = timezone.localdate()
+    quantities = {pk: quantity for pk, quantity in quantities.items() if pk is not None and quantity > 0}
+    with transaction.atomic():
+        for menu_item_id, quantity in sorted(quantities.items()):
+            MenuItem.objects.filter(pk=menu_item_id).update(
+                # Stock is only ever zero when it ran out: saving an item at zero switches it off.
+                available=Case(When(stock=0, then=Value(True)), default=F('available')),
+                stock=F('stock') + quantity,
+                # Only today's count is kept, so that is all a release can lower.
+                sold_today=Case(
+                    When(sold_on=today, then=Greatest(F('sold_today') - quantity, 0, output_field=PositiveIntegerField())),
+                    default=F('sold_today'),
+                ),
+            )
+        if quantities:
+            transaction.on_commit(invalidate_unavailable_ids)
+
+
+def order_quantities(order_ids):
+    """{menu_item_id: quantity} over the lines of the given orders."""
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids, menu_item__isnull=False)
+        .order_by().values('menu_item_id').annotate(quantity=Sum('quantity'))
+    )
+    return {row['menu_item_id']: row['quantity'] for row in rows}
+
+
+def release_order_stock(order_ids):
+    """
+    Give back the stock held by those of `order_ids` that still hold it.
+    Clearing Order.stock_reserved is a conditional UPDATE, so however often an
+    order is cancelled or deleted its stock is released once. Returns how many
+    orders released stock.
+    """
+    released = 0
+    with transaction.atomic():
+        for order_id in sorted(order_ids):
+            if Order.objects.filter(pk=order_id, stock_reserved=True).update(stock_reserved=False):
+                release_stock(order_quantities([order_id]))
+                released += 1
+    return released
+
+
+def reserve_order_stock(order_id):
+    """Reserve again the stock of an order that gave it back. Raises OutOfStock."""
+    with transaction.atomic():
+        if Order.objects.filter(pk=order_id, stock_reserved=False).update(stock_reserved=True):
+            reserve_stock(order_quantities([order_id]))
+
+
+def unavailable_menu_item_ids():
+    """
+    Ids of menu items that cannot be ordered right now: switched off, out of
+    stock or at today's cap. Cached per day for up to STOCK_CACHE_TIMEOUT
+    seconds, so catalogue reads check availability with one cache lookup per
+    response.
+    """
+    key = UNAVAILABLE_KEY.format(timezone.localdate().isoformat())
+    ids = _cache().get(key)
+    if ids is None:
+        ids = frozenset(MenuItem.objects.exclude(sellable(1, timezone.localdate())).values_list('pk', flat=True))
+        _cache().set(key, ids, timeout=settings.STOCK_CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate_unavailable_ids():
+    _cache().delete(UNAVAILABLE_KEY.format(timezone.localdate().isoformat()))
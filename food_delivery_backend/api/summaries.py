@@ -0,0 +1,146 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedTransaction, Order, OrderItem, OrderSummary, Transaction,
+)
+
+
+_suspended = ContextVar('order_summary_updates_suspended', default=False)
+
+
+@contextmanager
+def suspend_summary_updates():
+    # For bulk moves such as archiving, which delete rows without undoing history.
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def summary_updates_suspended():
+    return _suspended.get()
+
+
+def _ensure(user_ids):
+    existing = set(OrderSummary.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    OrderSummary.objects.bulk_create(
+        [OrderSummary(user_id=user_id) for user_id in set(user_ids) - existing], ignore_conflicts=True
+    )
+
+
+def record_orders(orders):
+    """Count newly created orders towards their users' summaries."""
+    by_user = {}
+    for order in orders:
+        count, latest = by_user.get(order.user_id, (0, None))
+        if latest is None or order.created_at >= latest.created_at:
+            latest = order
+        by_user[order.user_id] = (count + 1, latest)
+    _ensure(by_user)
+    for user_id, (count, latest) in by_user.items():
+        summaries = OrderSummary.objects.filter(user_id=user_id)
+        summaries.update(order_count=F('order_count') + count)
+        # Only move last_order forward, in case batches arrive out of order.
+        summaries.filter(last_order_at__isnull=True).update(last_order_id=latest.pk, last_order_at=latest.created_at)
+        summaries.filter(last_order_at__lt=latest.created_at).update(last_order_id=latest.pk, last_order_at=latest.created_at)
+
+
+def forget_orders(orders):
+    """Take deleted orders back out of their users' summaries."""
+    by_user = Counter(order.user_id for order in orders)
+    for user_id, count in by_user.items():
+        OrderSummary.objects.filter(user_id=user_id).update(order_count=Greatest(F('order_count') - count, 0))
+    gone = {order.pk for order in orders}
+    for summary in OrderSummary.objects.filter(user_id__in=by_user, last_order_id__in=gone):
+        # The deleted order was the latest one, so fall back to the next latest.
+        candidates = [
+            model.objects.filter(user_id=summary.user_id).exclude(pk__in=gone)
+            .order_by('-created_at').values_list('id', 'created_at').first()
+            for model in (Order, ArchivedOrder)
+        ]
+        summary.last_order_id, summary.last_order_at = max(
+            filter(None, candidates), key=lambda row: row[1], default=(None, None)
+        )
+        summary.save(update_fields=['last_order_id', 'last_order_at', 'updated_at'])
+
+
+@transaction.atomic
+def record_items(deltas):
+    """Apply {user_id: {menu_item_id: quantity delta}} to the favourite-item counts."""
+    deltas = {user_id: items for user_id, items in deltas.items() if any(items.values())}
+    if not deltas:
+        return
+    _ensure(deltas)
+    summaries = list(OrderSummary.objects.select_for_update().filter(user_id__in=deltas))
+    for summary in summaries:
+        counts = Counter({int(k): v for k, v in summary.item_counts.items()})
+        counts.update(deltas[summary.user_id])
+        summary.item_counts = {str(k): v for k, v in counts.items() if v > 0}
+    OrderSummary.objects.bulk_update(summaries, ['item_counts'])
+
+
+def record_spend(amounts):
+    """Apply {user_id: amount} of settled (positive) or reversed (negative) payments."""
+    amounts = {user_id: amount for user_id, amount in amounts.items() if amount}
+    _ensure(amounts)
+    for user_id, amount in amounts.items():
+        OrderSummary.objects.filter(user_id=user_id).update(
+            lifetime_spend=Greatest(F('lifetime_spend') + amount, Decimal('0.00'))
+        )
+
+
+def rebuild_order_summaries(user_ids=None):
+    """Recompute summaries from the live and archive tables. Returns how many were written."""
+    def scoped(queryset, field='user_id'):
+        return queryset if user_ids is None else queryset.filter(**{f'{field}__in': user_ids})
+
+    stats = {}
+
+    def entry(user_id):
+        return stats.setdefault(user_id, {'count': 0, 'spend': Decimal('0.00'), 'last': None, 'items': Counter()})
+
+    for model in (Order, ArchivedOrder):
+        for user_id, order_id, created_at in scoped(model.objects.order_by()).values_list('user_id', 'id', 'created_at'):
+            data = entry(user_id)
+            data['count'] += 1
+            if data['last'] is None or created_at >= data['last'][1]:
+                data['last'] = (order_id, created_at)
+    for model in (Transaction, ArchivedTransaction):
+        rows = scoped(model.objects.filter(status='success').order_by()).values('user_id').annotate(total=Sum('amount_due'))
+        for row in rows:
+            entry(row['user_id'])['spend'] += row['total']
+    for model in (OrderItem, ArchivedOrderItem):
+        rows = (
+            scoped(model.objects.filter(menu_item__isnull=False).order_by(), 'order__user_id')
+            .values('order__user_id', 'menu_item_id')
+            .annotate(quantity=Sum('quantity'))
+        )
+        for row in rows:
+            entry(row['order__user_id'])['items'][row['menu_item_id']] += row['quantity']
+
+    summaries = [
+        OrderSummary(
+            user_id=user_id,
+            order_count=data['count'],
+            lifetime_spend=data['spend'],
+            last_order_id=data['last'][0] if data['last'] else None,
+            last_order_at=data['last'][1] if data['last'] else None,
+            item_counts={str(k): v for k, v in data['items'].items()},
+        )
+        for user_id, data in stats.items()
+    ]
+    OrderSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['order_count', 'lifetime_spend', 'last_order_id', 'last_order_at', 'item_counts', 'updated_at'],
+    )
+    return len(summaries)
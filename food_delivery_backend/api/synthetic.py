@@ -0,0 +1,288 @@
+import multiprocessing
+import random
+import zlib
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connections
+from django.db.models import Max
+
+from .geo import encode_geohash
+from .models import Cart, CartItem, MenuItem, Order, OrderItem, Restaurant, Transaction
+
+
+# Generated rows are plain tuples in these field orders; the parent process
+# turns them into model instances for bulk_create.
+USER_FIELDS = ['id', 'email', 'password', 'first_name', 'last_name', 'phone_number', 'address', 'is_customer']
+RESTAURANT_FIELDS = ['id', 'user_id', 'name', 'location', 'latitude', 'longitude', 'geohash', 'description']
+MENU_ITEM_FIELDS = ['id', 'restaurant_id', 'name', 'category', 'price', 'description', 'available']
+CART_FIELDS = ['id', 'user_id', 'total_price']
+CART_ITEM_FIELDS = ['cart_id', 'menu_item_id', 'quantity']
+ORDER_FIELDS = ['id', 'user_id', 'status', 'total_price', 'payment_methods']
+ORDER_ITEM_FIELDS = ['order_id', 'menu_item_id', 'quantity', 'ordered_price']
+TRANSACTION_FIELDS = ['id', 'order_id', 'ordered_id', 'amount_due', 'payment_method', 'status', 'user_id']
+
+FIRST_NAMES = ['Amina', 'Brian', 'Grace', 'Isaac', 'Joan', 'Kato', 'Mary', 'Moses', 'Nakato', 'Peter', 'Ruth', 'Sam']
+LAST_NAMES = ['Akello', 'Byaruhanga', 'Kasozi', 'Mugisha', 'Nabirye', 'Namukasa', 'Okello', 'Ssemwogerere']
+AREAS = ['Kampala Central', 'Kololo', 'Ntinda', 'Nakawa', 'Makindye', 'Kawempe', 'Rubaga', 'Entebbe', 'Wakiso']
+ADJECTIVES = ['Golden', 'Spicy', 'Happy', 'Royal', 'Urban', 'Little', 'Green', 'Lakeside']
+NOUNS = ['Kitchen', 'Grill', 'Bites', 'Corner', 'Diner', 'Pot', 'Table', 'Express']
+DISHES = {
+    'appetizer': ['Samosa', 'Spring Roll', 'Chicken Wings'],
+    'main_course': ['Rolex', 'Luwombo', 'Pilau', 'Matooke', 'Burger', 'Pizza'],
+    'side_dish': ['Chips', 'Salad', 'Kachumbari'],
+    'dessert': ['Mandazi', 'Cake', 'Ice Cream'],
+    'beverage': ['Soda', 'Juice', 'Tea', 'Coffee'],
+    'kids_menu': ['Mini Burger', 'Nuggets'],
+}
+DISH_LIST = [(category, dish) for category, dishes in DISHES.items() for dish in dishes]
+# Order.status with the matching Transaction.status and its relative frequency.
+ORDER_OUTCOMES = [('delivered', 'success', 70), ('ready', 'success', 5), ('pending', 'pending', 20), ('cancelled', 'failed', 5)]
+PAYMENT_METHODS = [key for key, _ in Order.PaymentMethods]
+# Spread around Kampala.
+CENTER, SPREAD = (0.3476, 32.5825), 0.3
+
+
+def make_plan(seed, users, restaurants, items_per_restaurant, carts, orders, password, chunk_size):
+    """
+    Everything the workers need to generate any chunk on their own: counts,
+    the first id of each table (after the rows already there) and the hashed
+    password shared by every user.
+    """
+    def next_id(model):
+        return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+    return {
+        'seed': seed,
+        'password': password,
+        'chunk_size': chunk_size,
+        'users': users,
+        'restaurants': restaurants,
+        'items_per_restaurant': items_per_restaurant,
+        'carts': min(carts, users),
+        'orders': orders,
+        'user_base': next_id(User),
+        'restaurant_base': next_id(Restaurant),
+        'menu_item_base': next_id(MenuItem),
+        'cart_base': next_id(Cart),
+        'order_base': next_id(Order),
+        'transaction_base': next_id(Transaction),
+    }
+
+
+def stage_size(plan, stage):
+    return {
+        'users': plan['users'],
+        'restaurants': plan['restaurants'],
+        'menu_items': plan['restaurants'] * plan['items_per_restaurant'],
+        'carts': plan['carts'],
+        'orders': plan['orders'],
+    }[stage]
+
+
+def menu_item_price(plan, number):
+    # Derived from the item number alone so carts and orders price items without the database.
+    return Decimal(1000 + zlib.crc32(f"{plan['seed']}:{number}".encode()) % 40 * 500)
+
+
+def pick_lines(plan, rng, max_lines):
+    # Distinct menu items from one restaurant with a quantity each.
+    restaurant = rng.randrange(plan['restaurants'])
+    per_restaurant = plan['items_per_restaurant']
+    positions = rng.sample(range(per_restaurant), min(rng.randint(1, max_lines), per_restaurant))
+    lines = []
+    for position in positions:
+        number = restaurant * per_restaurant + position
+        lines.append((plan['menu_item_base'] + number, rng.randint(1, 3), menu_item_price(plan, number)))
+    return lines
+
+
+def generate_chunk(plan, stage, chunk):
+    """
+    Rows for one chunk of a stage, as {table: [tuples]}. The random generator is
+    seeded from (seed, stage, chunk), so the output does not depend on which
+    worker runs it or in what order.
+    """
+    rng = random.Random(f"{plan['seed']}:{stage}:{chunk}")
+    start = chunk * plan['chunk_size']
+    numbers = range(start, min(start + plan['chunk_size'], stage_size(plan, stage)))
+    rows = {}
+
+    if stage == 'users':
+        rows['users'] = [
+            (
+                plan['user_base'] + n,
+                f"user{plan['user_base'] + n}@synthetic.invalid",
+                plan['password'],
+                rng.choice(FIRST_NAMES),
+                rng.choice(LAST_NAMES),
+                f"+2567{rng.randrange(10 ** 8):08d}",
+                rng.choice(AREAS),
+                True,
+            )
+            for n in numbers
+        ]
+    elif stage == 'restaurants':
+        rows['restaurants'] = []
+        for n in numbers:
+            lat = CENTER[0] + rng.uniform(-SPREAD, SPREAD)
+            lng = CENTER[1] + rng.uniform(-SPREAD, SPREAD)
+            restaurant_id = plan['restaurant_base'] + n
+            rows['restaurants'].append((
+                restaurant_id,
+                plan['user_base'] + rng.randrange(plan['users']),
+                f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} #{restaurant_id}",
+                rng.choice(AREAS),
+                lat,
+                lng,
+                encode_geohash(lat, lng),
+                "",
+            ))
+    elif stage == 'menu_items':
+        per_restaurant = plan['items_per_restaurant']
+        rows['menu_items'] = []
+        for n in numbers:
+            restaurant, position = divmod(n, per_restaurant)
+            category, dish = DISH_LIST[position % len(DISH_LIST)]
+            # Unique per restaurant: the dish list repeats with a running number.
+            name = dish if position < len(DISH_LIST) else f"{dish} {position // len(DISH_LIST) + 1}"
+            rows['menu_items'].append((
+                plan['menu_item_base'] + n,
+                plan['restaurant_base'] + restaurant,
+                name,
+                category,
+                menu_item_price(plan, n),
+                "",
+                rng.random() < 0.95,
+            ))
+    elif stage == 'carts':
+        rows['carts'], rows['cart_items'] = [], []
+        for n in numbers:
+            cart_id = plan['cart_base'] + n
+            lines = pick_lines(plan, rng, 3)
+            total = sum((price * quantity for _, quantity, price in lines), Decimal('0.00'))
+            # One cart per user: the first `carts` users get one.
+            rows['carts'].append((cart_id, plan['user_base'] + n, total))
+            rows['cart_items'].extend((cart_id, menu_item_id, quantity) for menu_item_id, quantity, _ in lines)
+    elif stage == 'orders':
+        rows['orders'], rows['order_items'], rows['transactions'] = [], [], []
+        outcomes = [outcome[:2] for outcome in ORDER_OUTCOMES]
+        weights = [outcome[2] for outcome in ORDER_OUTCOMES]
+        for n in numbers:
+            order_id = plan['order_base'] + n
+            user_id = plan['user_base'] + rng.randrange(plan['users'])
+            status, payment_status = rng.choices(outcomes, weights)[0]
+            payment_method = rng.choice(PAYMENT_METHODS)
+            lines = pick_lines(plan, rng, 4)
+            total = sum((price * quantity for _, quantity, price in lines), Decimal('0.00'))
+            rows['orders'].append((order_id, user_id, status, total, payment_method))
+            rows['order_items'].extend((order_id, menu_item_id, quantity, price) for menu_item_id, quantity, price in lines)
+            rows['transactions'].append(
+                (plan['transaction_base'] + n, order_id, order_id, total, payment_method, payment_status, user_id)
+            )
+    return rows
+
+
+User = get_user_model()
+
+# Tables each stage fills, parents first.
+STAGES = [
+    ('users', [('users', User, USER_FIELDS)]),
+    ('restaurants', [('restaurants', Restaurant, RESTAURANT_FIELDS)]),
+    ('menu_items', [('menu_items', MenuItem, MENU_ITEM_FIELDS)]),
+    ('carts', [('carts', Cart, CART_FIELDS), ('cart_items', CartItem, CART_ITEM_FIELDS)]),
+    ('orders', [
+        ('orders', Order, ORDER_FIELDS),
+        ('order_items', OrderItem, ORDER_ITEM_FIELDS),
+        ('transactions', Transaction, TRANSACTION_FIELDS),
+    ]),
+]
+TABLES = dict(STAGES)
+
+
+def insert_rows(stage, rows):
+    counts = {}
+    for table, model, fields in TABLES[stage]:
+        # bulk_create batches per the backend's parameter limit.
+        model.objects.bulk_create([model(**dict(zip(fields, row))) for row in rows[table]])
+        counts[table] = len(rows[table])
+    return counts
+
+
+def _generate(args):
+    return generate_chunk(*args)
+
+
+def _generate_and_insert(args):
+    plan, stage, chunk = args
+    return insert_rows(stage, generate_chunk(plan, stage, chunk))
+
+
+def generate_dataset(plan, workers=1, insert_in_workers=None, progress=None):
+    """
+    Insert the dataset described by `plan`, stage by stage so every foreign key
+    points at rows that exist. Worker processes generate chunks; where the
+    database takes concurrent writers they insert them too, otherwise (SQLite)
+    this process inserts each chunk while the workers make the next ones.
+    Returns {table: rows inserted}.
+    """
+    if insert_in_workers is None:
+        insert_in_workers = connections['default'].vendor != 'sqlite'
+    counts = {}
+    pool = None
+    if workers > 1:
+        # Forked workers must not share this process's connections.
+        connections.close_all()
+        pool = multiprocessing.get_context('fork').Pool(workers)
+    try:
+        for stage, _ in STAGES:
+            chunk_count = -(-stage_size(plan, stage) // plan['chunk_size'])
+            jobs = [(plan, stage, chunk) for chunk in range(chunk_count)]
+            if pool and insert_in_workers:
+                inserted = pool.imap_unordered(_generate_and_insert, jobs)
+            else:
+                chunks = pool.imap(_generate, jobs) if pool else map(_generate, jobs)
+                inserted = (insert_rows(stage, rows) for rows in chunks)
+            for chunk_counts in inserted:
+                for table, count in chunk_counts.items():
+                    counts[table] = counts.get(table, 0) + count
+            if progress:
+                progress(stage)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    reset_sequences()
+    return counts
+
+
+def reset_sequences(using='default'):
+    # Rows were inserted with explicit ids; Postgres sequences must move past them.
+    connection = connections[using]
+    models = [User, Restaurant, MenuItem, Cart, CartItem, Order, OrderItem, Transaction]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def database_size(using='default'):
+    """Size of the database in bytes, or None for backends this does not know."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0]
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA page_count')
+            pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_size')
+            return pages * cursor.fetchone()[0]
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT SUM(data_length + index_length) FROM information_schema.tables WHERE table_schema = DATABASE()'
+            )
+            return cursor.fetchone()[0]
+    return None
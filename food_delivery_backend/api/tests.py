@@ -1,3 +1,975 @@
-from django.test import TestCase
+import json
+import math
+import random
+import time
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db import OperationalError, connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .archival import archive_orders, purge_abandoned_carts
+from . import cart_cache
+from .cart_cache import flush_dirty_carts
+from .checks import check_cart_cache
+from .db_routers import PrimaryReplicaRouter, allow_replica_reads
+from .intake import process_intake_batch, run_intake_worker
+from .idempotency import claim_key, request_fingerprint
+from .geo import EARTH_RADIUS_KM, covering_cells, encode_geohash, haversine_km
+from .middleware import ReplicaRoutingMiddleware
+from .paginators import ApproximateCountPaginator
+from .profiling import make_profiling_token
+from .settlement import FakePaymentProvider, settle_pending_transactions
+from .stock import OutOfStock, reserve_stock, unavailable_menu_item_ids
+from .summaries import rebuild_order_summaries
+from .synthetic import generate_chunk, make_plan
+from .models import (
+    ArchivedOrder, ArchivedTransaction, Cart, CartItem, IdempotencyKey, MenuItem, Order, OrderItem, OrderIntake, OrderSummary,
+    RequestProfile, Restaurant, Transaction,
+)
+from .throttling import SlidingWindowRateThrottle, _local_store
+
+
+THROTTLE_RATES = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': ['api.throttling.SlidingWindowRateThrottle'],
+    'DEFAULT_THROTTLE_RATES': {'register': '2/min', 'bench': '1000000/min'},
+}
+
+
+@override_settings(REST_FRAMEWORK=THROTTLE_RATES)
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        _local_store.clear()
+        self.client = APIClient()
+
+    def register(self, email):
+        return self.client.post(reverse('register'), {
+            'email': email, 'password': 'pass12345', 'first_name': 'A', 'last_name': 'B',
+        }, format='json')
+
+    # Mid-window, with nothing carried over from the previous one.
+    @mock.patch.object(SlidingWindowRateThrottle, 'timer', staticmethod(lambda: 60 * 1000 + 30))
+    def test_register_is_limited_per_ip_with_retry_after(self):
+        self.assertEqual(self.register('a@example.com').status_code, 201)
+        self.assertEqual(self.register('b@example.com').status_code, 201)
+
+        response = self.register('c@example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertLessEqual(int(response['Retry-After']), 120)
+
+    def test_previous_window_is_weighted(self):
+        throttle = SlidingWindowRateThrottle()
+        view = SimpleNamespace(throttle_scope='register')
+        request = APIRequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        throttle.timer = lambda: 60 * 1000 + 50
+        self.assertTrue(throttle.allow_request(request, view))
+        self.assertTrue(throttle.allow_request(request, view))
+        self.assertFalse(throttle.allow_request(request, view))
+
+        # 15s into the next window 75% of the previous two hits still count: 1.5 + 1.
+        throttle.timer = lambda: 60 * 1001 + 15
+        self.assertTrue(throttle.allow_request(request, view))
+        self.assertFalse(throttle.allow_request(request, view))
+        self.assertEqual(throttle.wait(), 15)
+        # At 45s only 25% does: 0.5 + 1.
+        throttle.timer = lambda: 60 * 1001 + 45
+        self.assertTrue(throttle.allow_request(request, view))
+        self.assertFalse(throttle.allow_request(request, view))
+
+    def test_overhead_stays_within_budget(self):
+        throttle = SlidingWindowRateThrottle()
+        view = SimpleNamespace(throttle_scope='bench')
+        request = APIRequestFactory().get('/')
+        request.user = AnonymousUser()
+        iterations = 20000
+
+        # Best of three runs, with headroom for slow CI machines; locally a call takes ~5us.
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                throttle.allow_request(request, view)
+            timings.append((time.perf_counter() - start) / iterations * 1e6)
+
+        self.assertLess(min(timings), 200)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_retried_order_is_created_once(self):
+        first = self.client.post(reverse('order-list'), {'payment_methods': 'cash'}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        second = self.client.post(reverse('order-list'), {'payment_methods': 'cash'}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['id'], first.data['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_other_payload_is_rejected(self):
+        self.client.post(reverse('order-list'), {'payment_methods': 'cash'}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(reverse('order-list'), {'payment_methods': 'paypal'}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_releases_key(self):
+        response = self.client.post(reverse('transaction-list'), {}, format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        order = Order.objects.create(user=self.user)
+        response = self.client.post(reverse('transaction-list'), {'order': order.id}, format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.client.post(reverse('transaction-list'), {'order': order.id}, format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Transaction.objects.filter(order=order).count(), 1)
+
+
+    def test_abandoned_claim_can_be_taken_over(self):
+        body = {'payment_methods': 'cash'}
+        record, claimed = claim_key(self.user, 'orders', 'abc', request_fingerprint(body))
+        self.assertTrue(claimed)
+        self.assertEqual(self.client.post(reverse('order-list'), body, format='json', HTTP_IDEMPOTENCY_KEY='abc').status_code, 409)
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.client.post(reverse('order-list'), body, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(response.status_code, 201)
+        stored = IdempotencyKey.objects.get()
+        self.assertEqual(stored.status_code, 201)
+        self.assertGreater(stored.expires_at, timezone.now() + timedelta(hours=23))
+
+
+class ArchivalTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        restaurant = Restaurant.objects.create(user=self.user, name='Chainz', location='Kampala')
+        self.dish = MenuItem.objects.create(restaurant=restaurant, name='Rolex', price='5.00')
+
+    def make_order(self, status, days_old):
+        order = Order.objects.create(user=self.user, status=status)
+        OrderItem.objects.create(order=order, menu_item=self.dish, quantity=2)
+        order.save()
+        Transaction.objects.create(order=order)
+        Order.objects.filter(pk=order.pk).update(updated_at=order.updated_at - timedelta(days=days_old))
+        return order
+
+    def test_old_finished_orders_move_to_archive(self):
+        old = self.make_order('delivered', days_old=100)
+        self.make_order('cancelled', days_old=5)
+        self.make_order('pending', days_old=100)
+
+        self.assertEqual(archive_orders(timedelta(days=90), batch_size=1), 1)
+
+        self.assertFalse(Order.objects.filter(pk=old.pk).exists())
+        self.assertFalse(Transaction.objects.filter(ordered_id=old.pk).exists())
+        archived = ArchivedOrder.objects.get(pk=old.pk)
+        self.assertEqual(archived.total_price, 10)
+        self.assertEqual(archived.orderitems.get().menu_item, self.dish)
+        self.assertEqual(ArchivedTransaction.objects.get().order, archived)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        live = client.get(reverse('order-list')).json()
+        history = client.get(reverse('order-list'), {'archived': 'true'}).json()
+        self.assertEqual(len(live), 2)
+        self.assertEqual([o['id'] for o in history], [old.pk])
+        self.assertEqual(history[0]['orderitems'][0]['menu_item_name'], 'Rolex')
+
+    def test_abandoned_carts_are_purged_and_recreated(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, menu_item=self.dish)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=cart.updated_at - timedelta(days=40))
+
+        self.assertEqual(purge_abandoned_carts(timedelta(days=30)), 1)
+        self.assertFalse(CartItem.objects.exists())
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('cart-detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cartitems'], [])
+
+
+class RestaurantMenuTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = get_user_model().objects.create(email='owner@example.com')
+        self.restaurant = Restaurant.objects.create(user=owner, name='Chainz', location='Kampala')
+        MenuItem.objects.create(restaurant=self.restaurant, name='Soda', category='beverage', price='1.00')
+        MenuItem.objects.create(restaurant=self.restaurant, name='Rolex', category='main_course', price='5.00')
+        MenuItem.objects.create(restaurant=self.restaurant, name='Chips', category='side_dish', price='2.00', available=False)
+        self.url = reverse('restaurant-menu', args=[self.restaurant.pk])
+
+    def test_menu_is_grouped_in_category_order(self):
+        menu = self.client.get(self.url).json()
+
+        self.assertEqual(menu['restaurant']['name'], 'Chainz')
+        self.assertEqual([c['category'] for c in menu['categories']], ['main_course', 'beverage'])
+        self.assertEqual(menu['categories'][0]['items'][0]['name'], 'Rolex')
+
+    def test_cached_menu_is_rebuilt_only_after_item_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            chips = MenuItem.objects.get(name='Chips')
+            chips.available = True
+            chips.save()
+        menu = self.client.get(self.url).json()
+        self.assertEqual([c['category'] for c in menu['categories']], ['main_course', 'side_dish', 'beverage'])
+
+    def test_unknown_restaurant_is_404(self):
+        self.assertEqual(self.client.get(reverse('restaurant-menu', args=[999])).status_code, 404)
+
+
+class MenuImportExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = get_user_model().objects.create(email='owner@example.com')
+        self.restaurant = Restaurant.objects.create(user=self.owner, name='Chainz', location='Kampala')
+        MenuItem.objects.create(restaurant=self.restaurant, name='Rolex', price='5.00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.import_url = reverse('restaurant-menu-import', args=[self.restaurant.pk])
+
+    def test_csv_import_upserts_and_reports_bad_rows(self):
+        body = 'name,category,price,available\nRolex,main_course,6.50,\nSoda,beverage,1.00,false\nSoda,beverage,1.00,\nTea,not_a_category,1,\n'
+        response = self.client.generic('POST', self.import_url, body, content_type='text/csv')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([e['row'] for e in response.data['errors']], [3, 4])
+        self.assertEqual(str(MenuItem.objects.get(name='Rolex').price), '6.50')
+        self.assertFalse(MenuItem.objects.get(name='Soda').available)
+        self.assertEqual(MenuItem.objects.count(), 2)
+
+    def test_json_import_and_export_round_trip(self):
+        rows = [{'name': f'Dish {n}', 'price': f'{n}.00', 'category': 'dessert'} for n in range(1200)]
+        response = self.client.post(self.import_url, rows, format='json')
+        self.assertEqual(response.data['created'], 1200)
+
+        export = self.client.get(reverse('restaurant-menu-export', args=[self.restaurant.pk]), {'file_type': 'json'})
+        exported = json.loads(b''.join(export.streaming_content))
+        self.assertEqual(len(exported), 1201)
+        self.assertIn({'name': 'Dish 7', 'category': 'dessert', 'price': '7.00', 'description': None, 'available': True}, exported)
+
+    def test_unparseable_file_writes_nothing(self):
+        rows = [{'name': f'Dish {n}', 'price': '1.00'} for n in range(600)]
+        body = json.dumps(rows)[:-1] + ', {"name": '
+        response = self.client.generic('POST', self.import_url, body, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(MenuItem.objects.count(), 1)
+
+    def test_import_refreshes_menu_availability(self):
+        menu_url = reverse('restaurant-menu', args=[self.restaurant.pk])
+        self.client.get(menu_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.import_url, [{'name': 'Rolex', 'price': '5.00', 'available': False}], format='json')
+        self.assertEqual(self.client.get(menu_url).json()['categories'], [])
+
+    def test_only_owner_can_import(self):
+        stranger = get_user_model().objects.create(email='stranger@example.com')
+        self.client.force_authenticate(stranger)
+        response = self.client.post(self.import_url, [{'name': 'Soda'}], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class NearbyRestaurantTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_covering_cells_contain_every_point_in_radius(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            lat, lng = rng.uniform(-70, 70), rng.uniform(-180, 180)
+            radius = rng.choice([0.5, 2, 5, 25])
+            cells = covering_cells(lat, lng, radius)
+            for _ in range(20):
+                other_lat = lat + rng.uniform(-1, 1) * radius / 111.19
+                other_lng = lng + rng.uniform(-1, 1) * radius / 40
+                if abs(other_lng) > 180 or haversine_km(lat, lng, other_lat, other_lng) > radius:
+                    continue
+                geohash = encode_geohash(other_lat, other_lng)
+                self.assertTrue(any(geohash.startswith(cell) for cell in cells), (lat, lng, radius))
+
+    def test_points_just_inside_the_radius_north_and_south_are_covered(self):
+        for lat, lng, radius in [(-20.486, 173.760, 88.8), (0.3476, 32.5825, 5), (61.2, -149.9, 40)]:
+            cells = covering_cells(lat, lng, radius)
+            dlat = math.degrees(radius * 0.99999 / EARTH_RADIUS_KM)
+            for other_lat in (lat + dlat, lat - dlat):
+                self.assertLessEqual(haversine_km(lat, lng, other_lat, lng), radius)
+                geohash = encode_geohash(other_lat, lng)
+                self.assertTrue(any(geohash.startswith(cell) for cell in cells), (lat, lng, radius, other_lat))
+
+    def test_nearby_ranks_by_distance_within_radius(self):
+        for name, lat, lng in [('Far', 0.40, 32.60), ('Near', 0.3480, 32.5830), ('Mid', 0.36, 32.59), ('Unknown', None, None)]:
+            Restaurant.objects.create(user=self.user, name=name, location='Kampala', latitude=lat, longitude=lng)
+
+        response = self.client.get(reverse('restaurant-nearby'), {'lat': 0.3476, 'lng': 32.5825, 'radius': 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['name'] for r in response.data], ['Near', 'Mid'])
+        self.assertLess(response.data[0]['distance_km'], 0.1)
+
+    def test_nearby_requires_coordinates(self):
+        self.assertEqual(self.client.get(reverse('restaurant-nearby'), {'lat': 0.3}).status_code, 400)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class PrimaryReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_replica_only_when_allowed(self):
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+        with allow_replica_reads():
+            self.assertEqual(self.router.db_for_read(Order), 'replica1')
+            self.assertEqual(self.router.db_for_write(Order), 'default')
+
+    def request_through_middleware(self, method, url_name='order-list', status_code=200):
+        seen = {}
+
+        def view(request):
+            seen['read_db'] = self.router.db_for_read(Order)
+            request.resolver_match = SimpleNamespace(url_name=url_name)
+            return HttpResponse(status=status_code)
+
+        request = getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION='Bearer token-a')
+        ReplicaRoutingMiddleware(view)(request)
+        return seen['read_db']
+
+    def test_client_reads_its_own_writes_after_mutation(self):
+        self.assertEqual(self.request_through_middleware('get'), 'replica1')
+        self.assertEqual(self.request_through_middleware('post'), 'default')
+        self.assertEqual(self.request_through_middleware('get'), 'default')
+
+    def test_failed_or_unrelated_writes_do_not_pin(self):
+        self.request_through_middleware('post', status_code=400)
+        self.request_through_middleware('post', url_name='register')
+        self.assertEqual(self.request_through_middleware('get'), 'replica1')
+
+
+@override_settings(CART_CACHE_ENABLED=True, CART_CACHE_FLUSH_INTERVAL=0)
+class CachedCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_store.clear()
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        restaurant = Restaurant.objects.create(user=self.user, name='Chainz', location='Kampala')
+        self.rolex = MenuItem.objects.create(restaurant=restaurant, name='Rolex', price='5.00')
+        self.soda = MenuItem.objects.create(restaurant=restaurant, name='Soda', price='1.50')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cart_is_served_from_cache_and_flushed_at_checkout(self):
+        self.client.post(reverse('cart-item-list'), {'menu_item': self.rolex.pk, 'quantity': 2}, format='json')
+        self.client.post(reverse('cart-item-list'), {'menu_item': self.rolex.pk}, format='json')
+        self.client.post(reverse('cart-item-list'), {'menu_item': self.soda.pk}, format='json')
+
+        with self.assertNumQueries(0):
+            cart = self.client.get(reverse('cart-detail')).json()
+        self.assertEqual(cart['total_price'], '16.50')
+        self.assertEqual({i['menu_item']: i['quantity'] for i in cart['cartitems']}, {self.rolex.pk: 3, self.soda.pk: 1})
+        self.assertFalse(CartItem.objects.exists())
+
+        self.client.post(reverse('order-list'), {}, format='json')
+
+        self.assertEqual(
+            dict(CartItem.objects.values_list('menu_item_id', 'quantity')), {self.rolex.pk: 3, self.soda.pk: 1}
+        )
+        self.assertEqual(str(Cart.objects.get(user=self.user).total_price), '16.50')
+
+    def test_write_behind_flush_and_item_edits(self):
+        self.client.post(reverse('cart-item-list'), {'menu_item': self.soda.pk, 'quantity': 4}, format='json')
+        self.assertIsNone(self.client.get(reverse('cart-item-list')).json()[0]['id'])
+
+        self.assertEqual(flush_dirty_carts(), 1)
+        row = CartItem.objects.get()
+        self.assertEqual(self.client.get(reverse('cart-item-list')).json()[0]['id'], row.pk)
+
+        response = self.client.patch(reverse('cart-item-detail', args=[row.pk]), {'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        cart = self.client.get(reverse('cart-detail')).json()
+        self.assertEqual(cart['cartitems'][0]['quantity'], 1)
+        self.assertEqual(cart['total_price'], '1.50')
+
+    def test_items_added_during_a_flush_are_kept(self):
+        self.client.post(reverse('cart-item-list'), {'menu_item': self.rolex.pk}, format='json')
+        write_state = cart_cache._write_state
+
+        def add_while_writing(user_id, state):
+            written = write_state(user_id, state)
+            self.client.post(reverse('cart-item-list'), {'menu_item': self.soda.pk, 'quantity': 2}, format='json')
+            return written
+
+        with mock.patch.object(cart_cache, '_write_state', add_while_writing):
+            flush_dirty_carts()
+        self.assertEqual(dict(CartItem.objects.values_list('menu_item_id', 'quantity')), {self.rolex.pk: 1})
+        items = {i['menu_item']: i['id'] for i in self.client.get(reverse('cart-item-list')).json()}
+        self.assertEqual(items, {self.rolex.pk: CartItem.objects.get().pk, self.soda.pk: None})
+
+        # Still dirty, so the next flush writes the soda.
+        self.assertEqual(flush_dirty_carts(), 1)
+        self.assertEqual(
+            dict(CartItem.objects.values_list('menu_item_id', 'quantity')), {self.rolex.pk: 1, self.soda.pk: 2}
+        )
+
+
+    def test_lock_gives_up_and_only_releases_its_own_hold(self):
+        key = cart_cache.LOCK_KEY.format(self.user.pk)
+        cache.set(key, 'someone-else')
+        with mock.patch.object(cart_cache, 'LOCK_WAIT', 0.02), self.assertRaises(cart_cache.CartBusy):
+            with cart_cache._cart_lock(self.user.pk):
+                pass
+
+        cache.delete(key)
+        with cart_cache._cart_lock(self.user.pk):
+            # Our hold expired and another worker took the lock.
+            cache.set(key, 'someone-else')
+        self.assertEqual(cache.get(key), 'someone-else')
+
+    def test_check_requires_a_shared_cache(self):
+        self.assertEqual([e.id for e in check_cart_cache(None)], ['api.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_cart_cache(None), [])
+
+
+@override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_BUFFER_SIZE=2)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create(email='staff@example.com', is_staff=True, is_superuser=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.token = make_profiling_token(self.staff)
+
+    def test_profiled_request_is_captured_with_sql_origins(self):
+        response = self.client.get(reverse('order-list'), HTTP_X_PROFILE_TOKEN=self.token)
+
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.path, reverse('order-list'))
+        self.assertGreater(profile.query_count, 0)
+        self.assertTrue(any('in list' in frame for query in profile.sql_log for frame in query['origin']))
+
+    @skipUnless(apps.is_installed('django.contrib.admin'), 'admin is not installed in the API-only runtime')
+    def test_profiles_are_downloadable_from_admin(self):
+        response = self.client.get(reverse('order-list'), HTTP_X_PROFILE_TOKEN=self.token)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+
+        self.client.force_login(self.staff)
+        download = self.client.get(reverse('admin:api_requestprofile_download', args=[profile.pk, 'prof']))
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin:api_requestprofile_change', args=[profile.pk])).status_code, 200)
+
+    def test_only_staff_tokens_enable_profiling(self):
+        customer = get_user_model().objects.create(email='eater@example.com')
+        self.client.get(reverse('order-list'), {'_profile': make_profiling_token(customer)})
+        self.client.get(reverse('order-list'), {'_profile': 'forged'})
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_buffer_keeps_newest_profiles(self):
+        for _ in range(4):
+            last = self.client.get(reverse('order-list'), {'_profile': self.token})
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        self.assertTrue(RequestProfile.objects.filter(pk=last['X-Profile-Id']).exists())
+
+    def test_query_token_is_not_stored(self):
+        response = self.client.get(reverse('order-list'), {'_profile': self.token, 'page': 1})
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.path, reverse('order-list') + '?page=1')
+
+    @override_settings(REQUEST_PROFILING_ENABLED=False)
+    def test_profiling_can_be_switched_off(self):
+        self.client.get(reverse('order-list'), HTTP_X_PROFILE_TOKEN=self.token)
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+@skipUnless(apps.is_installed('django.contrib.admin'), 'admin is not installed in the API-only runtime')
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create(email='staff@example.com', is_staff=True, is_superuser=True)
+        restaurant = Restaurant.objects.create(user=self.staff, name='Chainz', location='Kampala')
+        self.dish = MenuItem.objects.create(restaurant=restaurant, name='Rolex', price='5.00')
+        self.client.force_login(self.staff)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            user = get_user_model().objects.create(email=f'eater{Order.objects.count()}@example.com')
+            CartItem.objects.create(cart=Cart.objects.create(user=user, total_price=0), menu_item=self.dish)
+            order = Order.objects.create(user=user)
+            OrderItem.objects.create(order=order, menu_item=self.dish)
+            order.save()
+            Transaction.objects.create(order=order)
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:api_{name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        names = ['customuser', 'restaurant', 'menuitem', 'order', 'orderitem', 'cart', 'cartitem', 'transaction']
+        self.add_orders(1)
+        before = {name: self.changelist_queries(name) for name in names}
+        self.add_orders(5)
+        self.assertEqual({name: self.changelist_queries(name) for name in names}, before)
+
+    def test_search_matches_emails_case_insensitively(self):
+        self.add_orders(2)
+        response = self.client.get(reverse('admin:api_order_changelist'), {'q': 'EATER1@example.com'})
+        self.assertContains(response, 'eater1@example.com')
+        self.assertNotContains(response, 'eater0@example.com')
+
+    def test_name_search_is_an_indexed_prefix_match(self):
+        MenuItem.objects.create(restaurant=self.dish.restaurant, name='Big Rolex', price='7.00')
+        response = self.client.get(reverse('admin:api_menuitem_changelist'), {'q': 'ROL'})
+        self.assertContains(response, 'Rolex')
+        self.assertNotContains(response, 'Big Rolex')
+
+        if connection.vendor == 'sqlite':
+            sql, params = MenuItem.objects.filter(name__istartswith='rol').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                self.assertIn('api_menuitem_name_prefix', str(cursor.fetchall()))
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+    def test_paginator_count_is_capped(self):
+        self.add_orders(5)
+        self.assertEqual(ApproximateCountPaginator(Order.objects.all(), 2).count, 3)
+        self.assertEqual(ApproximateCountPaginator(Order.objects.filter(status='ready'), 2).count, 0)
+
+
+class OrderSummaryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        restaurant = Restaurant.objects.create(user=self.user, name='Chainz', location='Kampala')
+        self.rolex = MenuItem.objects.create(restaurant=restaurant, name='Rolex', price='5.00')
+        self.soda = MenuItem.objects.create(restaurant=restaurant, name='Soda', price='1.00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def place_order(self, *lines, paid=True):
+        order = Order.objects.create(user=self.user)
+        for menu_item, quantity in lines:
+            OrderItem.objects.create(order=order, menu_item=menu_item, quantity=quantity)
+        order.save()
+        payment = Transaction.objects.create(order=order)
+        if paid:
+            payment.status = 'success'
+            payment.save()
+        return order
+
+    def test_summary_is_maintained_incrementally(self):
+        self.place_order((self.rolex, 2), (self.soda, 1))
+        last = self.place_order((self.soda, 3), paid=False)
+        line = last.orderitems.get()
+        line.quantity = 5
+        line.save()
+
+        summary = self.client.get(reverse('order-summary')).json()
+
+        self.assertEqual(summary['order_count'], 2)
+        self.assertEqual(summary['lifetime_spend'], '11.00')
+        self.assertEqual(summary['last_order_id'], last.pk)
+        self.assertEqual(
+            [(f['menu_item_name'], f['quantity']) for f in summary['favorite_items']], [('Soda', 6), ('Rolex', 2)]
+        )
+
+        payment = Transaction.objects.get(order=last)
+        payment.status = 'success'
+        payment.save()
+        payment.status = 'failed'
+        payment.save()
+        self.assertEqual(str(OrderSummary.objects.get(user=self.user).lifetime_spend), '11.00')
+
+    def test_archiving_keeps_summary_and_rebuild_matches(self):
+        order = self.place_order((self.rolex, 1))
+        Order.objects.filter(pk=order.pk).update(status='delivered', updated_at=order.updated_at - timedelta(days=100))
+        archive_orders(timedelta(days=90))
+        self.place_order((self.soda, 2))
+        incremental = OrderSummary.objects.values('order_count', 'lifetime_spend', 'last_order_id', 'item_counts').get()
+
+        OrderSummary.objects.all().delete()
+        rebuild_order_summaries()
+
+        rebuilt = OrderSummary.objects.values('order_count', 'lifetime_spend', 'last_order_id', 'item_counts').get()
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(rebuilt['order_count'], 2)
+
+    def test_deleting_orders_takes_them_out_of_the_summary(self):
+        first = self.place_order((self.rolex, 1))
+        last = self.place_order((self.soda, 2))
+        last.delete()
+
+        summary = OrderSummary.objects.get(user=self.user)
+        self.assertEqual((summary.order_count, summary.last_order_id), (1, first.pk))
+        self.assertEqual(summary.item_counts, {str(self.rolex.pk): 1})
+
+        first.delete()
+        summary.refresh_from_db()
+        self.assertEqual((summary.order_count, summary.last_order_id, summary.last_order_at), (0, None, None))
+
+    def test_backfill_migration_builds_missing_summaries(self):
+        self.place_order((self.rolex, 2), (self.soda, 1))
+        expected = OrderSummary.objects.values('order_count', 'lifetime_spend', 'last_order_id', 'item_counts').get()
+        OrderSummary.objects.all().delete()
+
+        migration = ('api', '0015_backfill_order_summaries')
+        state_apps = MigrationLoader(connection).project_state(migration).apps
+        import_module('api.migrations.0015_backfill_order_summaries').backfill(state_apps, None)
+
+        rebuilt = OrderSummary.objects.values('order_count', 'lifetime_spend', 'last_order_id', 'item_counts').get()
+        self.assertEqual(rebuilt, expected)
+
+    def test_order_headers_are_paged_and_expand_on_request(self):
+        for _ in range(3):
+            self.place_order((self.rolex, 1), (self.soda, 1))
+
+        with self.assertNumQueries(2):
+            page = self.client.get(reverse('order-header-list'), {'page_size': 2}).json()
+        self.assertEqual(page['count'], 3)
+        self.assertEqual(len(page['results']), 2)
+        self.assertEqual(page['results'][0]['item_count'], 2)
+        self.assertNotIn('orderitems', page['results'][0])
+
+        expanded = self.client.get(reverse('order-header-list'), {'expand': 'items'}).json()
+        self.assertEqual(len(expanded['results'][0]['orderitems']), 2)
+
+
+class SettlementTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        restaurant = Restaurant.objects.create(user=self.user, name='Chainz', location='Kampala')
+        dish = MenuItem.objects.create(restaurant=restaurant, name='Rolex', price='5.00')
+        self.payments = []
+        for _ in range(5):
+            order = Order.objects.create(user=self.user)
+            OrderItem.objects.create(order=order, menu_item=dish)
+            order.save()
+            self.payments.append(Transaction.objects.create(order=order))
+
+    def test_pending_transactions_settle_in_batches(self):
+        failed = self.payments[1]
+        provider = FakePaymentProvider(overrides={failed.pk: 'failed', self.payments[4].pk: 'pending'})
+
+        totals = settle_pending_transactions(provider, batch_size=2, max_workers=2)
+
+        self.assertEqual((totals['success'], totals['failed'], totals['pending']), (3, 1, 1))
+        self.assertEqual(Transaction.objects.get(pk=failed.pk).status, 'failed')
+        self.assertEqual(Order.objects.get(pk=failed.order_id).status, 'cancelled')
+        self.assertEqual(Order.objects.get(pk=self.payments[0].order_id).status, 'ready')
+        self.assertEqual(Order.objects.get(pk=self.payments[4].order_id).status, 'pending')
+        self.assertEqual(str(OrderSummary.objects.get(user=self.user).lifetime_spend), '15.00')
+
+    def test_provider_errors_leave_batch_pending(self):
+        class FlakyProvider(FakePaymentProvider):
+            def fetch_statuses(self, payments):
+                if any(p['id'] == self.broken for p in payments):
+                    raise ConnectionError('provider down')
+                return super().fetch_statuses(payments)
+
+        provider = FlakyProvider()
+        provider.broken = self.payments[0].pk
+        with self.assertLogs('api.settlement', 'ERROR') as logs:
+            totals = settle_pending_transactions(provider, batch_size=2, max_workers=3)
+
+        self.assertEqual((totals['success'], totals['errors']), (3, 2))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('failed for 2 transactions; leaving them pending', logs.records[0].getMessage())
+        self.assertEqual(str(logs.records[0].exc_info[1]), 'provider down')
+        self.assertEqual(Transaction.objects.filter(status='pending').count(), 2)
+
+    def test_command_refuses_to_run_without_a_provider(self):
+        with self.assertRaises(CommandError):
+            call_command('settle_transactions', stdout=StringIO())
+        self.assertEqual(Transaction.objects.filter(status='pending').count(), 5)
+
+        with override_settings(PAYMENT_PROVIDER='api.settlement.FakePaymentProvider'):
+            call_command('settle_transactions', stdout=StringIO())
+        self.assertFalse(Transaction.objects.filter(status='pending').exists())
+
+
+class OrderIntakeTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        restaurant = Restaurant.objects.create(user=self.user, name='Chainz', location='Kampala')
+        self.rolex = MenuItem.objects.create(restaurant=restaurant, name='Rolex', price='5.00')
+        self.soda = MenuItem.objects.create(restaurant=restaurant, name='Soda', price='2.00', available=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def queue(self, *lines):
+        items = [{'menu_item': item.pk, 'quantity': quantity} for item, quantity in lines]
+        return self.client.post(reverse('order-intake'), {'payment_methods': 'cash', 'items': items}, format='json')
+
+    def test_intake_is_acknowledged_then_materialized(self):
+        response = self.queue((self.rolex, 3))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.queue().status_code, 400)
+
+        self.assertEqual(process_intake_batch(), 1)
+
+        intake = self.client.get(reverse('order-intake-detail', args=[response.json()['id']])).json()
+        self.assertEqual(intake['status'], 'processed')
+        order = Order.objects.get(pk=intake['order'])
+        self.assertEqual((str(order.total_price), order.payment_methods), ('15.00', 'cash'))
+        self.assertEqual(str(order.orderitems.get().ordered_price), '5.00')
+        payment = Transaction.objects.get(order=order)
+        self.assertEqual((payment.status, str(payment.amount_due), payment.user_id), ('pending', '15.00', self.user.pk))
+        summary = OrderSummary.objects.get(user=self.user)
+        self.assertEqual((summary.order_count, summary.item_counts), (1, {str(self.rolex.pk): 3}))
+
+    def test_unavailable_items_reject_the_intake(self):
+        self.queue((self.rolex, 1), (self.soda, 1))
+        process_intake_batch()
+        intake = OrderIntake.objects.get()
+        self.assertEqual(intake.status, 'rejected')
+        self.assertIn(str(self.soda.pk), intake.error)
+        self.assertFalse(Order.objects.exists())
+
+    def test_workers_take_disjoint_partitions(self):
+        ids = [self.queue((self.rolex, 1)).json()['id'] for _ in range(4)]
+        self.assertEqual(process_intake_batch(worker=0, workers=2), 2)
+        processed = set(OrderIntake.objects.filter(status='processed').values_list('id', flat=True))
+        self.assertEqual(processed, {pk for pk in ids if pk % 2 == 0})
+        self.assertEqual(process_intake_batch(worker=1, workers=2), 2)
+        self.assertEqual(Order.objects.count(), 4)
+
+    def test_intakes_taken_by_another_invocation_are_not_processed_again(self):
+        self.queue((self.rolex, 1))
+        self.queue((self.rolex, 2))
+        stale = OrderIntake.objects.order_by('id')  # What another host read before we committed.
+        self.assertEqual(process_intake_batch(), 2)
+        with mock.patch('api.intake.queued_intakes', return_value=stale):
+            self.assertEqual(process_intake_batch(), 0)
+        self.assertEqual(Order.objects.count(), 2)
+
+    @override_settings(INTAKE_LOCK_RETRIES=2)
+    def test_worker_retries_only_lock_errors_and_only_so_often(self):
+        locked = OperationalError('database is locked')
+        with mock.patch('api.intake.process_intake_batch', side_effect=[locked, locked, 3, 0]):
+            with self.assertLogs('api.intake', 'WARNING'):
+                self.assertEqual(run_intake_worker(poll_interval=0, once=True), 3)
+        with mock.patch('api.intake.process_intake_batch', side_effect=[locked] * 3):
+            with self.assertRaises(OperationalError), self.assertLogs('api.intake', 'WARNING'):
+                run_intake_worker(poll_interval=0, once=True)
+        with mock.patch('api.intake.process_intake_batch', side_effect=OperationalError('no such table: api_order')):
+            with self.assertRaises(OperationalError):
+                run_intake_worker(poll_interval=0, once=True)
+
+
+class StockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(email='eater@example.com')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Chainz', location='Kampala')
+        self.rolex = MenuItem.objects.create(restaurant=self.restaurant, name='Rolex', price='5.00', stock=3)
+        self.soda = MenuItem.objects.create(restaurant=self.restaurant, name='Soda', price='2.00', daily_cap=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reservation_is_all_or_nothing_and_sells_out(self):
+        with self.assertRaises(OutOfStock) as raised:
+            reserve_stock({self.rolex.pk: 1, self.soda.pk: 3})
+        self.assertEqual(raised.exception.menu_item_ids, [self.soda.pk])
+        self.rolex.refresh_from_db()
+        self.assertEqual(self.rolex.stock, 3)
+
+        reserve_stock({self.rolex.pk: 3})
+        self.rolex.refresh_from_db()
+        self.assertEqual((self.rolex.stock, self.rolex.available, self.rolex.sold_today), (0, False, 3))
+        with self.assertRaises(OutOfStock):
+            reserve_stock({self.rolex.pk: 1})
+
+    def test_daily_cap_restarts_each_day(self):
+        reserve_stock({self.soda.pk: 2})
+        with self.assertRaises(OutOfStock):
+            reserve_stock({self.soda.pk: 1})
+        MenuItem.objects.filter(pk=self.soda.pk).update(sold_on=timezone.localdate() - timedelta(days=1))
+        reserve_stock({self.soda.pk: 2})
+        self.soda.refresh_from_db()
+        self.assertEqual((self.soda.sold_today, self.soda.available), (2, True))
+
+    def test_order_items_cannot_oversell(self):
+        order = Order.objects.create(user=self.user)
+        url = reverse('order-item-list')
+        self.assertEqual(self.client.post(url, {'order': order.pk, 'menu_item': self.rolex.pk, 'quantity': 2}).status_code, 201)
+        response = self.client.post(url, {'order': order.pk, 'menu_item': self.rolex.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('menu_item', response.json())
+        self.assertEqual(MenuItem.objects.get(pk=self.rolex.pk).stock, 1)
+
+    def test_catalogue_reads_availability_from_cache(self):
+        menu_url = reverse('restaurant-menu', args=[self.restaurant.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(menu_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({self.soda.pk: 2})
+
+        menu = self.client.get(menu_url).json()
+        self.assertEqual([item['name'] for c in menu['categories'] for item in c['items']], ['Rolex'])
+        with self.assertNumQueries(0):
+            self.client.get(menu_url)
+        items = {item['name']: item['available'] for item in self.client.get(reverse('menu-item-list')).json()}
+        self.assertEqual(items, {'Rolex': True, 'Soda': False})
+
+    def place_order(self, menu_item, quantity):
+        reserve_stock({menu_item.pk: quantity})
+        order = Order.objects.create(user=self.user, stock_reserved=True)
+        OrderItem.objects.create(order=order, menu_item=menu_item, quantity=quantity)
+        Transaction.objects.create(order=order)
+        return order
+
+    def stock(self, menu_item):
+        menu_item.refresh_from_db()
+        return menu_item.stock, menu_item.available, menu_item.sold_today
+
+    def test_failed_payment_gives_stock_back(self):
+        order = self.place_order(self.rolex, 3)
+        self.assertEqual(self.stock(self.rolex), (0, False, 3))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIn(self.rolex.pk, unavailable_menu_item_ids())
+            settle_pending_transactions(FakePaymentProvider('failed'))
+
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'cancelled')
+        self.assertEqual(self.stock(self.rolex), (3, True, 0))
+        self.assertNotIn(self.rolex.pk, unavailable_menu_item_ids())
+
+    def test_cancelled_and_deleted_orders_give_stock_back(self):
+        order = self.place_order(self.soda, 2)
+        order.status = 'cancelled'
+        order.save()
+        order.save()
+        self.assertEqual(self.stock(self.soda), (None, True, 0))
+
+        self.place_order(self.rolex, 2).delete()
+        self.assertEqual(self.stock(self.rolex), (3, True, 0))
+
+        delivered = self.place_order(self.rolex, 1)
+        delivered.status = 'delivered'
+        delivered.save()
+        Order.objects.get(pk=delivered.pk).delete()
+        self.assertEqual(self.stock(self.rolex), (2, True, 1))
+
+    def test_repeated_cancelling_releases_once(self):
+        order = self.place_order(self.rolex, 2)
+        response = self.client.patch(reverse('order-detail', args=[order.pk]), {'status': 'cancelled'}, format='json')
+        self.assertEqual((response.status_code, response.json()['status']), (200, 'pending'))
+        self.assertEqual(self.stock(self.rolex), (1, True, 2))
+
+        for status in ['cancelled', 'pending', 'cancelled', 'ready', 'cancelled']:
+            order.status = status
+            order.save()
+            self.assertEqual(self.stock(self.rolex)[0], 3 if status == 'cancelled' else 1)
+        order.delete()
+        self.assertEqual(self.stock(self.rolex), (3, True, 0))
+
+        order = self.place_order(self.rolex, 3)
+        order.status = 'cancelled'
+        order.save()
+        self.place_order(self.rolex, 3)
+        order.status = 'pending'
+        with self.assertRaises(OutOfStock):
+            order.save()
+
+    def test_editing_order_lines_moves_their_reservations(self):
+        url = reverse('order-item-list')
+        order = Order.objects.create(user=self.user)
+        line = self.client.post(url, {'order': order.pk, 'menu_item': self.rolex.pk, 'quantity': 2}, format='json').json()
+        detail = reverse('order-item-detail', args=[line['id']])
+
+        self.client.patch(detail, {'quantity': 1}, format='json')
+        self.assertEqual(self.stock(self.rolex)[0], 2)
+        self.client.patch(detail, {'menu_item': self.soda.pk, 'quantity': 2}, format='json')
+        self.assertEqual((self.stock(self.rolex)[0], self.stock(self.soda)[2]), (3, 2))
+        self.assertEqual(self.client.delete(detail).status_code, 204)
+        self.assertEqual(self.stock(self.soda)[2], 0)
+
+        self.client.post(url, {'order': order.pk, 'menu_item': self.rolex.pk, 'quantity': 1}, format='json')
+        Order.objects.filter(pk=order.pk).update(status='ready')
+        response = self.client.post(url, {'order': order.pk, 'menu_item': self.rolex.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.rolex)[0], 2)
+
+    @override_settings(STOCK_CACHE_ALIAS='stock', STOCK_CACHE_TIMEOUT=30, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'stock': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'stock'},
+    })
+    def test_availability_uses_its_own_cache_and_timeout(self):
+        with mock.patch.object(caches['stock'], 'set', wraps=caches['stock'].set) as cache_set:
+            self.assertEqual(unavailable_menu_item_ids(), frozenset())
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], 30)
+        self.assertIsNone(cache.get(f'menu-unavailable:{timezone.localdate().isoformat()}'))
+
+    def test_intake_rejects_sold_out_items(self):
+        OrderIntake.objects.create(user=self.user, payload={'payment_methods': 'cash', 'items': [{'menu_item': self.rolex.pk, 'quantity': 4}]})
+        process_intake_batch()
+        self.assertEqual(OrderIntake.objects.get().status, 'rejected')
+        self.assertEqual(MenuItem.objects.get(pk=self.rolex.pk).stock, 3)
+
+
+class SyntheticDataTests(TestCase):
+    def test_bad_sizes_are_command_errors(self):
+        for option in [{'users': 0}, {'items_per_restaurant': 0}, {'workers': 0}, {'orders': -1}]:
+            with self.assertRaises(CommandError):
+                call_command('generate_synthetic_data', stdout=StringIO(), **option)
+        self.assertEqual(get_user_model().objects.count(), 0)
+
+    def test_generated_dataset_is_consistent(self):
+        call_command(
+            'generate_synthetic_data', users=30, restaurants=3, items_per_restaurant=30, carts=10, orders=60,
+            workers=1, chunk_size=25, stdout=StringIO(),
+        )
+
+        self.assertEqual(get_user_model().objects.count(), 30)
+        self.assertEqual(MenuItem.objects.count(), 90)
+        self.assertEqual(Cart.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 60)
+        self.assertTrue(get_user_model().objects.first().check_password('snacknow'))
+        for order in Order.objects.prefetch_related('orderitems', 'transactions'):
+            self.assertEqual(order.total_price, sum(item.subtotal for item in order.orderitems.all()))
+            self.assertEqual(order.transactions.get().amount_due, order.total_price)
+        self.assertEqual(OrderSummary.objects.aggregate(total=Sum('order_count'))['total'], 60)
+        # Ids continue after the generated ones.
+        self.assertGreater(Order.objects.create(user=get_user_model().objects.first()).pk, 60)
+
+    def test_chunks_are_deterministic(self):
+        plan = make_plan(7, 10, 2, 5, 5, 40, 'hash', 16)
+        self.assertEqual(generate_chunk(plan, 'orders', 1), generate_chunk(dict(plan), 'orders', 1))
+        self.assertNotEqual(generate_chunk(plan, 'orders', 1), generate_chunk({**plan, 'seed': 8}, 'orders', 1))
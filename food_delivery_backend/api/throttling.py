@@ -0,0 +1,160 @@
+import math
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=64)
+def parse_rate(rate):
+    # "5/min" -> (5, 60), "100/h" -> (100, 3600)
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+class LocalWindowStore:
+    """
+    Per-process counters: key -> [window index, current count, previous count, duration].
+    Idle keys are swept whenever the table doubles in size, so memory stays
+    proportional to the number of active clients.
+    """
+
+    def __init__(self, sweep_at=1024):
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._sweep_at = sweep_at
+
+    def counts(self, key, window):
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None:
+                return 0, 0
+            return tuple(self._roll(entry, window)[1:3])
+
+    def hit(self, key, window, duration):
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None:
+                if len(self._windows) >= self._sweep_at:
+                    self._sweep()
+                self._windows[key] = [window, 1, 0, duration]
+                return
+            self._roll(entry, window)[1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+    def _roll(self, entry, window):
+        if entry[0] != window:
+            entry[2] = entry[1] if entry[0] == window - 1 else 0
+            entry[1] = 0
+            entry[0] = window
+        return entry
+
+    def _sweep(self):
+        # Anything older than the previous window no longer affects its estimate.
+        now = time.time()
+        self._windows = {
+            k: v for k, v in self._windows.items() if v[0] >= int(now // v[3]) - 1
+        }
+        self._sweep_at = max(self._sweep_at, len(self._windows) * 2)
+
+
+class CacheWindowStore:
+    """
+    Counters kept in a Django cache so every worker shares one budget. There is
+    no clear(): the alias is shared with other data, and windows expire on their own.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def counts(self, key, window):
+        current_key, previous_key = f'{key}:{window}', f'{key}:{window - 1}'
+        values = self.cache.get_many([current_key, previous_key])
+        return values.get(current_key, 0), values.get(previous_key, 0)
+
+    def hit(self, key, window, duration):
+        current_key = f'{key}:{window}'
+        # The counter has to outlive the next window, where it is read as "previous".
+        if not self.cache.add(current_key, 1, timeout=duration * 2):
+            self.cache.incr(current_key)
+
+
+_local_store = LocalWindowStore()
+
+
+def get_store():
+    alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', None)
+    if alias:
+        return CacheWindowStore(alias)
+    return _local_store
+
+
+class SlidingWindowRateThrottle(BaseThrottle):
+    """
+    Sliding-window counter limited per `throttle_scope` on the view.
+
+    The count for the last `duration` seconds is estimated from the current
+    fixed window plus the previous one weighted by how much of it still
+    overlaps, so each check is two counter reads and one increment.
+    Requests are keyed by user id when authenticated and by client IP otherwise.
+    Views without a scope, or scopes without a rate in
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], are not limited.
+    """
+
+    timer = time.time
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return None, None
+        return scope, parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope))
+
+    def get_cache_key(self, request, scope):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            ident = f'user:{user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{scope}:{ident}'
+
+    def allow_request(self, request, view):
+        scope, rate = self.get_rate(view)
+        if rate is None:
+            return True
+        self.num_requests, self.duration = rate
+        self.store = get_store()
+
+        now = self.timer()
+        window, elapsed = divmod(now, self.duration)
+        window = int(window)
+        key = self.get_cache_key(request, scope)
+        current, previous = self.store.counts(key, window)
+        weight = 1 - elapsed / self.duration
+
+        if previous * weight + current >= self.num_requests:
+            self._wait = self._seconds_until_allowed(current, previous, elapsed)
+            return False
+        self.store.hit(key, window, self.duration)
+        return True
+
+    def _seconds_until_allowed(self, current, previous, elapsed):
+        limit, duration = self.num_requests, self.duration
+        if current >= limit:
+            # Only the next window can help; by then `current` is the weighted part.
+            return (duration - elapsed) + duration * (1 - limit / current)
+        return max(duration * (1 - (limit - current) / previous) - elapsed, 0)
+
+    def wait(self):
+        return math.ceil(getattr(self, '_wait', 0)) or 1
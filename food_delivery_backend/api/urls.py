@@ -1,12 +1,15 @@
 from django.urls import path
 from . import views
-from rest_framework_simplejwt.views import (TokenObtainPairView,TokenRefreshView)
 
 urlpatterns = [
     path('register/', views.RegisterView.as_view(), name='register'),
     path('user/', views.UserDetailView.as_view(), name='user-detail'),
     path('restaurants/', views.RestaurantListCreateView.as_view(), name='restaurant-list'),
+    path('restaurants/nearby/', views.RestaurantNearbyView.as_view(), name='restaurant-nearby'),
     path('restaurants/<int:pk>/', views.RestaurantDetailView.as_view(), name='restaurant-detail'),
+    path('restaurants/<int:pk>/menu/', views.RestaurantMenuView.as_view(), name='restaurant-menu'),
+    path('restaurants/<int:pk>/menu/import/', views.RestaurantMenuImportView.as_view(), name='restaurant-menu-import'),
+    path('restaurants/<int:pk>/menu/export/', views.RestaurantMenuExportView.as_view(), name='restaurant-menu-export'),
     path('menu-items/', views.MenuItemListCreateView.as_view(), name='menu-item-list'),
     path('menu-items/categories/', views.CategoriesView.as_view(), name='menu-items-categories'),
     path('menu-items/categories/<str:category>/', views.CategoriesViewItems.as_view(), name='category-details'),
@@ -15,6 +18,10 @@ urlpatterns = [
     path('cart-items/', views.CartItemListCreateView.as_view(), name='cart-item-list'),
     path('cart-items/<int:pk>/', views.CartItemDetailView.as_view(), name='cart-item-detail'),
     path('orders/', views.OrderListCreateView.as_view(), name='order-list'),
+    path('orders/summary/', views.OrderSummaryView.as_view(), name='order-summary'),
+    path('orders/headers/', views.OrderHeaderListView.as_view(), name='order-header-list'),
+    path('orders/intake/', views.OrderIntakeCreateView.as_view(), name='order-intake'),
+    path('orders/intake/<int:pk>/', views.OrderIntakeDetailView.as_view(), name='order-intake-detail'),
     path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('order-items/', views.OrderItemListCreateView.as_view(), name='order-item-list'),
     path('order-items/<int:pk>/', views.OrderItemDetailView.as_view(), name='order-item-detail'),
@@ -22,6 +29,6 @@ urlpatterns = [
     path('transactions/<int:pk>/', views.TransactionDetailView.as_view(), name='transaction-detail'),
     
     
-    path('auth-api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('auth-api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth-api/token/', views.ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth-api/token/refresh/', views.ThrottledTokenRefreshView.as_view(), name='token_refresh'),
 ]
\ No newline at end of file
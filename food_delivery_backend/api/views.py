@@ -1,16 +1,39 @@
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView
+from rest_framework.generics import CreateAPIView, ListCreateAPIView, RetrieveUpdateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView, RetrieveAPIView
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
-from .models import Restaurant, MenuItem, Order, OrderItem, Cart, CartItem, Transaction
-from .serializers import RegisterUserSerializer, CustomUserSerializer, RestaurantSerializer, MenuItemSerializer, OrderSerializer, OrderItemSerializer, CartSerializer, CartItemSerializer, TransactionSerializer
+from .models import Restaurant, MenuItem, Order, OrderItem, Cart, CartItem, Transaction, ArchivedOrder, ArchivedTransaction, OrderSummary, OrderIntake
+from .cart_cache import (
+    add_item, cart_cache_enabled, cart_representation, flush_cart, get_user_cart, invalidate_cart_state,
+    item_representation, load_cart_state,
+)
+from .geo import nearby
+from .idempotency import IdempotentCreateMixin
+from .menus import get_restaurant_menu
+from .stock import OutOfStock, release_stock, reserve_stock
+from .menu_io import PARSE_ERRORS, export_csv, export_json, import_menu_items, iter_csv_rows, iter_json_rows
+from .serializers import RegisterUserSerializer, CustomUserSerializer, RestaurantSerializer, MenuItemSerializer, OrderSerializer, OrderItemSerializer, CartSerializer, CartItemSerializer, TransactionSerializer, NearbyQuerySerializer, NearbyRestaurantSerializer, OrderHeaderSerializer, ExpandedOrderHeaderSerializer, OrderSummarySerializer, OrderIntakeSerializer, ArchivedOrderSerializer, ArchivedTransactionSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+
+def wants_archive(request):
+    # History lists read the archive tables with ?archived=true
+    return request.method == 'GET' and request.query_params.get('archived', '').lower() in ('1', 'true', 'yes')
 
 
 # User Registration
 class RegisterView(APIView):
+    throttle_scope = 'register'
+
     def post(self, request):
         serializer = RegisterUserSerializer(data=request.data)
 
@@ -31,6 +54,14 @@ class UserDetailView(RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
     def get_object(self):
         return self.request.user
+
+
+# Token Views
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    throttle_scope = 'auth'
+
+class ThrottledTokenRefreshView(TokenRefreshView):
+    throttle_scope = 'auth'
     
 
 
@@ -46,6 +77,72 @@ class RestaurantDetailView(RetrieveUpdateDestroyAPIView):
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
     permission_classes = [IsAuthenticated]
+
+class RestaurantNearbyView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = NearbyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        lat, lng, radius, limit = (params.validated_data[k] for k in ('lat', 'lng', 'radius', 'limit'))
+
+        restaurants = nearby(Restaurant.objects.all(), lat, lng, radius)[:limit]
+        return Response(NearbyRestaurantSerializer(restaurants, many=True, context={'request': request}).data)
+
+class RestaurantMenuView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, pk):
+        menu = get_restaurant_menu(pk)
+        if menu is None:
+            return Response({'detail': 'No Restaurant matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(menu)
+
+class RestaurantMenuImportView(APIView):
+    # Body is either a multipart upload in `file` or the raw CSV/JSON itself,
+    # and is parsed while it is read rather than buffered up front.
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        restaurant = get_object_or_404(Restaurant, pk=pk)
+        if restaurant.user != request.user:
+            raise PermissionDenied("You can only import items to your own restaurant")
+
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+            stream, is_csv = upload, upload.name.lower().endswith('.csv')
+        else:
+            stream, is_csv = request.stream, request.content_type.startswith('text/csv')
+        if stream is None:
+            return Response({'detail': 'Empty request body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = iter_csv_rows(stream) if is_csv else iter_json_rows(stream)
+        try:
+            result = import_menu_items(restaurant, rows)
+        except PARSE_ERRORS as exc:
+            return Response({'detail': f'Could not parse file: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+class RestaurantMenuExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        restaurant = get_object_or_404(Restaurant, pk=pk)
+        if restaurant.user != request.user:
+            raise PermissionDenied("You can only export your own restaurant's menu")
+
+        items = restaurant.restaurant_menuitems.order_by('name')
+        if request.query_params.get('file_type', 'csv') == 'json':
+            response = StreamingHttpResponse(export_json(items), content_type='application/json')
+            filename = f'menu-{restaurant.pk}.json'
+        else:
+            response = StreamingHttpResponse(export_csv(items), content_type='text/csv')
+            filename = f'menu-{restaurant.pk}.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
     
     
 
@@ -63,7 +160,7 @@ class MenuItemListCreateView(ListCreateAPIView):
     def perform_create(self, serializer):
         restaurant = serializer.validated_data['restaurant']
         if restaurant.user != self.request.user:
-            raise serializer.ValidationError("You can only add items to your own restaurant")
+            raise serializers.ValidationError("You can only add items to your own restaurant")
         serializer.save()
 
 class MenuItemDetailView(RetrieveUpdateDestroyAPIView):
@@ -93,26 +190,61 @@ class CategoriesViewItems(APIView):
 
 
 # Cart Views
+# With CART_CACHE_ENABLED the cart and its item list are served from the cache
+# and additions are written to the tables in batches (see api/cart_cache.py).
+# Anything else flushes the cached cart first and drops it afterwards.
 class CartDetailView(RetrieveUpdateAPIView):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
     def get_object(self):
-        return Cart.objects.get(user=self.request.user)
+        if cart_cache_enabled():
+            flush_cart(self.request.user)
+        return get_user_cart(self.request.user)
+    def retrieve(self, request, *args, **kwargs):
+        if cart_cache_enabled():
+            return Response(cart_representation(load_cart_state(request.user)))
+        return super().retrieve(request, *args, **kwargs)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_cart_state(self.request.user)
 
 class CartItemListCreateView(ListCreateAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'cart'
     def get_queryset(self):
         return CartItem.objects.filter(cart__user=self.request.user)
+    def list(self, request, *args, **kwargs):
+        if cart_cache_enabled():
+            state = load_cart_state(request.user)
+            return Response([item_representation(state, menu_item_id) for menu_item_id in state['items']])
+        return super().list(request, *args, **kwargs)
+    def create(self, request, *args, **kwargs):
+        if not cart_cache_enabled():
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        menu_item = serializer.validated_data['menu_item']
+        state = add_item(request.user, menu_item, serializer.validated_data.get('quantity', 1))
+        return Response(item_representation(state, menu_item.pk), status=status.HTTP_201_CREATED)
     def perform_create(self, serializer):
-        cart = Cart.objects.get(user=self.request.user)
+        cart = get_user_cart(self.request.user)
         serializer.save(cart=cart)
 
 class CartItemDetailView(RetrieveUpdateDestroyAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'cart'
     def get_queryset(self):
+        if cart_cache_enabled():
+            flush_cart(self.request.user)
         return CartItem.objects.filter(cart__user=self.request.user)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_cart_state(self.request.user)
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_cart_state(self.request.user)
     
     
     
@@ -121,14 +253,74 @@ class CartItemDetailView(RetrieveUpdateDestroyAPIView):
     
 
 # Order Views
-class OrderListCreateView(ListCreateAPIView):
+class OrderListCreateView(IdempotentCreateMixin, ListCreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    idempotency_scope = 'orders'
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        if wants_archive(self.request):
+            return ArchivedOrder.objects.filter(user=self.request.user).prefetch_related('orderitems__menu_item')
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related('orderitems__menu_item')
+    def get_serializer_class(self):
+        if wants_archive(self.request):
+            return ArchivedOrderSerializer
+        return OrderSerializer
     def perform_create(self, serializer):
+        if cart_cache_enabled():
+            flush_cart(self.request.user)
         serializer.save(user=self.request.user)
 
+class AcceptedCreateAPIView(CreateAPIView):
+    # The object is only queued, so the client is told 202 rather than 201.
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+class OrderIntakeCreateView(IdempotentCreateMixin, AcceptedCreateAPIView):
+    # Poll orders/intake/<id>/ for the order once process_order_intake has run.
+    serializer_class = OrderIntakeSerializer
+    permission_classes = [IsAuthenticated]
+    idempotency_scope = 'order-intake'
+    def perform_create(self, serializer):
+        if cart_cache_enabled():
+            flush_cart(self.request.user)
+        serializer.save(user=self.request.user)
+
+class OrderIntakeDetailView(RetrieveAPIView):
+    serializer_class = OrderIntakeSerializer
+    permission_classes = [IsAuthenticated]
+    def get_queryset(self):
+        return OrderIntake.objects.filter(user=self.request.user)
+
+class OrderHeaderPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+class OrderHeaderListView(ListAPIView):
+    # Order history without line items; ?expand=items adds them back.
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderHeaderPagination
+    def expanded(self):
+        return self.request.query_params.get('expand') == 'items'
+    def get_queryset(self):
+        orders = (
+            Order.objects.filter(user=self.request.user).select_related('user')
+            .annotate(item_count=Count('orderitems')).order_by('-created_at', '-id')
+        )
+        if self.expanded():
+            orders = orders.prefetch_related('orderitems__menu_item')
+        return orders
+    def get_serializer_class(self):
+        return ExpandedOrderHeaderSerializer if self.expanded() else OrderHeaderSerializer
+
+class OrderSummaryView(RetrieveAPIView):
+    serializer_class = OrderSummarySerializer
+    permission_classes = [IsAuthenticated]
+    def get_object(self):
+        return OrderSummary.objects.get_or_create(user=self.request.user)[0]
+
 class OrderDetailView(RetrieveUpdateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
@@ -136,6 +328,24 @@ class OrderDetailView(RetrieveUpdateAPIView):
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
 
+def reserve_order_item(menu_item, quantity):
+    if menu_item is None or quantity <= 0:
+        return
+    try:
+        reserve_stock({menu_item.pk: quantity})
+    except OutOfStock:
+        raise serializers.ValidationError({'menu_item': ["This item is out of stock."]})
+
+def release_order_item(order, menu_item_id, quantity):
+    # Only orders still holding their stock have anything to give back.
+    if order.stock_reserved and menu_item_id is not None and quantity > 0:
+        release_stock({menu_item_id: quantity})
+
+def check_order_is_pending(order):
+    # Lines are what an order reserved; once it has moved on they are history.
+    if order.status != 'pending':
+        raise serializers.ValidationError("Only pending orders can be changed")
+
 class OrderItemListCreateView(ListCreateAPIView):
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
@@ -144,14 +354,41 @@ class OrderItemListCreateView(ListCreateAPIView):
     def perform_create(self, serializer):
         order = serializer.validated_data['order']
         if order.user != self.request.user:
-            raise serializer.ValidationError("You can only add items to your own order")
-        serializer.save()
+            raise serializers.ValidationError("You can only add items to your own order")
+        check_order_is_pending(order)
+        with transaction.atomic():
+            reserve_order_item(serializer.validated_data.get('menu_item'), serializer.validated_data.get('quantity', 1))
+            Order.objects.filter(pk=order.pk).update(stock_reserved=True)
+            serializer.save()
 
 class OrderItemDetailView(RetrieveUpdateDestroyAPIView):
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
     def get_queryset(self):
         return OrderItem.objects.filter(order__user=self.request.user)
+    def perform_update(self, serializer):
+        # The old line's stock goes back and the new line's is taken, so the
+        # order always holds exactly what its lines say.
+        item = serializer.instance
+        if serializer.validated_data.get('order', item.order) != item.order:
+            raise serializers.ValidationError({'order': ["Lines cannot move between orders."]})
+        check_order_is_pending(item.order)
+        menu_item = serializer.validated_data.get('menu_item', item.menu_item)
+        quantity = serializer.validated_data.get('quantity', item.quantity)
+        with transaction.atomic():
+            if menu_item is not None and menu_item.pk == item.menu_item_id:
+                release_order_item(item.order, item.menu_item_id, item.quantity - quantity)
+                reserve_order_item(menu_item, quantity - item.quantity)
+            else:
+                release_order_item(item.order, item.menu_item_id, item.quantity)
+                reserve_order_item(menu_item, quantity)
+            Order.objects.filter(pk=item.order_id).update(stock_reserved=True)
+            serializer.save()
+    def perform_destroy(self, instance):
+        check_order_is_pending(instance.order)
+        with transaction.atomic():
+            release_order_item(instance.order, instance.menu_item_id, instance.quantity)
+            instance.delete()
     
     
     
@@ -161,15 +398,22 @@ class OrderItemDetailView(RetrieveUpdateDestroyAPIView):
     
 
 # Transaction Views
-class TransactionListCreateView(ListCreateAPIView):
+class TransactionListCreateView(IdempotentCreateMixin, ListCreateAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    idempotency_scope = 'transactions'
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
+        if wants_archive(self.request):
+            return ArchivedTransaction.objects.filter(user=self.request.user).select_related('user')
+        return Transaction.objects.filter(user=self.request.user).select_related('user')
+    def get_serializer_class(self):
+        if wants_archive(self.request):
+            return ArchivedTransactionSerializer
+        return TransactionSerializer
     def perform_create(self, serializer):
         order = serializer.validated_data['order']
         if order.user != self.request.user:
-            raise serializer.ValidationError("You can only create transactions for your own orders")
+            raise serializers.ValidationError("You can only create transactions for your own orders")
         serializer.save(user=self.request.user)
 
 class TransactionDetailView(RetrieveUpdateAPIView):
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,8 +48,21 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.SlidingWindowRateThrottle',
+    ],
+    # Budgets per view `throttle_scope`, counted per user (or per IP when anonymous).
+    'DEFAULT_THROTTLE_RATES': {
+        'register': '5/min',
+        'auth': '20/min',
+        'cart': '120/min',
+    },
 }
 
+# Cache alias holding throttle counters. None keeps them in process memory;
+# point it at a shared cache (e.g. Redis/Memcached) when running several workers.
+THROTTLE_CACHE_ALIAS = None
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -59,8 +73,74 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# How long a stored response is replayed for a repeated Idempotency-Key.
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# A key whose request has not finished after this long (its worker died) can
+# be claimed by a retry. Keep it above the slowest create request.
+IDEMPOTENCY_PENDING_TIMEOUT = timedelta(minutes=2)
+
+# Delivered/cancelled orders untouched for ARCHIVE_ORDERS_AFTER and carts untouched
+# for ARCHIVE_CARTS_AFTER are moved out of the live tables by `manage.py archive_orders`.
+ARCHIVE_ORDERS_AFTER = timedelta(days=90)
+ARCHIVE_CARTS_AFTER = timedelta(days=30)
+ARCHIVE_BATCH_SIZE = 500
+
+# Restaurant menu documents live in MENU_CACHE_ALIAS and are dropped when an item
+# changes. Dropping only reaches other workers through a shared cache (e.g.
+# Redis/Memcached); with the per-process default a stale menu lasts at most
+# MENU_CACHE_TIMEOUT seconds.
+MENU_CACHE_ALIAS = 'default'
+MENU_CACHE_TIMEOUT = 5 * 60
+
+# The set of menu items that cannot be ordered right now (sold out, at today's
+# cap or switched off) lives in STOCK_CACHE_ALIAS and is dropped whenever stock
+# changes. As with menus, only a shared cache makes that reach every worker;
+# otherwise another worker's copy is stale for at most STOCK_CACHE_TIMEOUT seconds.
+STOCK_CACHE_ALIAS = 'default'
+STOCK_CACHE_TIMEOUT = 30
+
+# Serve carts from CART_CACHE_ALIAS and write them to the Cart/CartItem tables at
+# checkout or when `manage.py flush_carts --loop` runs, every CART_CACHE_FLUSH_INTERVAL seconds.
+# The cache must be shared by all workers and big enough never to evict a cart;
+# `manage.py check` fails if CART_CACHE_ENABLED points at a per-process cache.
+CART_CACHE_ENABLED = False
+CART_CACHE_ALIAS = 'default'
+CART_CACHE_FLUSH_INTERVAL = 10
+CART_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Staff can profile single requests with a token from `manage.py profiling_token`.
+# The newest REQUEST_PROFILING_BUFFER_SIZE captures are kept, viewable in the admin.
+# Off unless SNACKNOW_REQUEST_PROFILING=1.
+REQUEST_PROFILING_ENABLED = os.environ.get('SNACKNOW_REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_TOKEN_MAX_AGE = 60 * 60
+REQUEST_PROFILING_BUFFER_SIZE = 50
+
+# Payment settlement (`manage.py settle_transactions`). The provider class implements
+# api.settlement.PaymentProvider. None until one is configured: the command refuses
+# to run without it. api.settlement.FakePaymentProvider settles everything as
+# successful and is only for local development and tests.
+PAYMENT_PROVIDER = None
+SETTLEMENT_BATCH_SIZE = 200
+SETTLEMENT_MAX_WORKERS = 4
+# Order.status given to still-pending orders once their payment settles.
+SETTLEMENT_ORDER_STATUSES = {'success': 'ready', 'failed': 'cancelled'}
+
+# Queued orders (POST orders/intake/) are turned into orders by `manage.py
+# process_order_intake`, INTAKE_BATCH_SIZE per transaction in each worker process.
+INTAKE_BATCH_SIZE = 200
+INTAKE_WORKERS = 2
+INTAKE_POLL_INTERVAL = 1.0
+# Consecutive "database is locked" errors a worker retries before giving up.
+INTAKE_LOCK_RETRIES = 50
+
+# Admin changelists count at most this many rows; bigger unfiltered tables show
+# the planner's estimate (Postgres) instead of running COUNT(*).
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
+    'api.profiling.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,6 +169,32 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'food_delivery_backend.wsgi.application'
 
+# API-only runtime for workers that only serve the JWT API (SNACKNOW_API_ONLY=1).
+# Drops the admin, sessions, messages, static files and templates, the middleware
+# that only they need, and the browsable API. Run the admin from a separate
+# process without the flag. The gain is per request (about a quarter less time
+# in the middleware stack on a cheap endpoint); boot time and memory are
+# dominated by Django, DRF and simplejwt and barely move. Compare with
+# `manage.py bench_startup`.
+API_ONLY = os.environ.get('SNACKNOW_API_ONLY') == '1'
+
+if API_ONLY:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    )]
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    )]
+    TEMPLATES = []
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['rest_framework.renderers.JSONRenderer']
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -100,6 +206,29 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. SNACKNOW_REPLICA_DATABASES=/srv/replica1.sqlite3,/srv/replica2.sqlite3
+# Safe requests read from a random replica; writes and everything outside a
+# request use 'default'. Replicas mirror 'default' under the test runner.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('SNACKNOW_REPLICA_DATABASES', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['api.db_routers.PrimaryReplicaRouter']
+
+# After a client changes its cart or orders, its reads stay on the primary for
+# this long. The cache must be shared between workers for this to hold across them.
+DATABASE_STICKY_SECONDS = 5
+DATABASE_STICKY_CACHE_ALIAS = 'default'
+DATABASE_STICKY_URL_NAMES = [
+    'cart-detail', 'cart-item-list', 'cart-item-detail',
+    'order-list', 'order-detail', 'order-item-list', 'order-item-detail', 'order-intake',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators